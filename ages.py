@@ -0,0 +1,138 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+import aliases
+import datasets
+
+# Eligible ages of the trials as numeric intervals.
+#
+# 'Age eligible for study' is free text ("18-65", "16 years and older",
+# "1 month - 16 years", "12_65", "up to 48 hours"). parse() turns it into
+# [min_age, max_age] in years, with an open upper end as inf. The column has
+# a few hundred distinct spellings at most, so only those are parsed (one
+# regex over the categories) and the rows take their interval by code.
+#
+# age_group() derives the 'Age Group' buckets the seizure page groups on
+# from the interval, replacing the hand-maintained column; AgeIndex answers
+# "trials whose eligibility overlaps ages X-Y" from the distinct intervals
+# instead of comparing every row.
+#
+#   python ages.py        # parse coverage and disagreements with 'Age Group'
+
+# years per unit; a bound without a unit takes the other bound's, else years
+UNITS = {'year': 1.0, 'month': 1 / 12, 'week': 7 / 365.25, 'day': 1 / 365.25, 'hour': 1 / 8766}
+_UNIT = r'(year|month|week|day|hour)s?'
+AGE = (
+    r'^(?P<up_to>up to\s*)?'
+    rf'(?P<low>\d+(?:\.\d+)?)\s*(?:{_UNIT})?\s*'
+    rf'(?:(?:-|to)\s*(?P<high>\d+(?:\.\d+)?)\s*(?:{_UNIT})?|(?P<open>(?:and|or)\s+(?:older|over|above)))?$'
+)
+
+# labels of the hand-made column, kept so charts and filters do not change
+GROUPS = ['Adult', 'Children', 'Children/Adult', 'Eldely', 'Newborn', 'Newborn/Children']
+
+
+def _parse_text(texts):
+    # [min_age, max_age] for each distinct text
+    text = pd.Series(texts, dtype=object).fillna('').astype(str).str.casefold()
+    text = text.str.replace(r'[_–—]', '-', regex=True).str.replace(r'\s+', ' ', regex=True).str.strip()
+    parts = text.str.extract(AGE)
+    parts.columns = ['up_to', 'low', 'low_unit', 'high', 'high_unit', 'open']
+    low = parts['low'].astype(float)
+    high = parts['high'].astype(float)
+    low_unit = parts['low_unit'].fillna(parts['high_unit']).fillna('year').map(UNITS)
+    high_unit = parts['high_unit'].fillna(parts['low_unit']).fillna('year').map(UNITS)
+
+    min_age = low * low_unit
+    max_age = high * high_unit
+    # "N and older": open above; "up to N": from birth; a bare "N": exactly N
+    max_age = max_age.mask(parts['open'].notna(), np.inf)
+    up_to = parts['up_to'].notna()
+    max_age = max_age.mask(up_to, min_age)
+    min_age = min_age.mask(up_to, 0.0)
+    max_age = max_age.fillna(min_age)
+    return pd.DataFrame({'min_age': min_age.to_numpy(), 'max_age': max_age.to_numpy()})
+
+
+def parse(values):
+    # min_age, max_age in years per row of `values` (NaN when not understood)
+    values = pd.Series(values)
+    categorical = aliases.factorize(values)
+    distinct = _parse_text(categorical.categories)
+    # a trailing NaN row for missing values (code -1)
+    bounds = np.vstack([distinct.to_numpy(dtype=float), [np.nan, np.nan]])
+    taken = bounds[categorical.codes]
+    return pd.DataFrame({'min_age': taken[:, 0], 'max_age': taken[:, 1]}, index=values.index)
+
+
+def age_group(min_age, max_age):
+    # The hand-made buckets as rules: from 60 'Eldely', from 15 'Adult';
+    # younger minimums are 'Children/Adult' when adults are eligible, else
+    # newborns (under 1 year) and/or children up to 18
+    min_age = np.asarray(min_age, dtype=float)
+    max_age = np.asarray(max_age, dtype=float)
+    conditions = [
+        min_age >= 60,
+        min_age >= 15,
+        max_age > 18,
+        (min_age < 1) & (max_age <= 2),
+        min_age < 1,
+        max_age <= 18,
+    ]
+    labels = ['Eldely', 'Adult', 'Children/Adult', 'Newborn', 'Newborn/Children', 'Children']
+    groups = np.select(conditions, labels, default='')
+    groups = np.where(np.isnan(min_age), None, groups)
+    return pd.Categorical(groups, categories=GROUPS)
+
+
+def with_age_groups(frame, column='Age eligible for study'):
+    # `frame` with 'Age Group' derived from `column`, keeping the existing
+    # value only where the text could not be parsed
+    bounds = parse(frame[column])
+    derived = pd.Series(age_group(bounds['min_age'], bounds['max_age']), index=frame.index)
+    if 'Age Group' in frame:
+        derived = derived.fillna(frame['Age Group'].astype(pd.CategoricalDtype(GROUPS)))
+    frame = frame.assign(**{'Age Group': derived})
+    return frame, bounds
+
+
+class AgeIndex:
+
+    def __init__(self, min_age, max_age):
+        # rows grouped by their distinct (min_age, max_age) interval; rows
+        # without an interval are left out
+        bounds = np.column_stack([np.asarray(min_age, dtype=float), np.asarray(max_age, dtype=float)])
+        known = np.flatnonzero(~np.isnan(bounds).any(axis=1))
+        intervals, inverse = np.unique(bounds[known], axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        self.min_age = intervals[:, 0]
+        self.max_age = intervals[:, 1]
+        order = np.argsort(inverse, kind='stable')
+        self.rows = known[order]
+        sizes = np.bincount(inverse, minlength=len(intervals))
+        self.stops = np.cumsum(sizes)
+        self.starts = self.stops - sizes
+        self.n_rows = len(bounds)
+
+    def overlapping(self, low, high):
+        # sorted positions of the rows whose eligible ages overlap [low, high]
+        hit = np.flatnonzero((self.min_age <= high) & (self.max_age >= low))
+        if not len(hit):
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate([self.rows[self.starts[i]:self.stops[i]] for i in hit]))
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or ['minus_ole_generalized', 'minus_ole', 'country']:
+        frame = datasets.load(name)
+        bounds = parse(frame['Age eligible for study'])
+        missing = frame['Age eligible for study'][bounds['min_age'].isna()].dropna().unique()
+        print(f'{name}: {bounds["min_age"].notna().sum()} of {len(frame)} rows parsed; not understood: {list(missing)}')
+        if 'Age Group' in frame:
+            derived, _ = with_age_groups(frame)
+            changed = frame['Age Group'].astype(object) != derived['Age Group'].astype(object)
+            report = frame.loc[changed, ['Age eligible for study', 'Age Group']].assign(derived=derived.loc[changed, 'Age Group'])
+            print(f'  {changed.sum()} rows get a different Age Group:')
+            print(report.drop_duplicates().to_string(index=False))
@@ -0,0 +1,288 @@
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+
+import pandas as pd
+
+import countries
+import datasets
+import ingest
+import mapped
+import sponsors
+
+# Pre-aggregated tables for the dashboards.
+#
+# `python aggregates.py` reads the row-level exports once and writes small
+# Arrow IPC tables to build/aggregates. The dashboards call load(), which only
+# rebuilds when one of the source files has changed since the last build, so
+# rerun cost no longer depends on how many trials are in the raw export.
+# table() returns the memory-mapped table itself (see mapped.py), shared
+# by every process serving the dashboards, for views that filter it before
+# taking a pandas frame.
+#
+# Trials appended through ingest.py are counted on top of the exports. A new
+# batch is folded into the existing tables by delta (apply_batch) rather than
+# by a rebuild, so ingest cost follows the batch size, not the history.
+
+AGGREGATES_DIR = os.path.join(datasets.BUILD_DIR, 'aggregates')
+MANIFEST = os.path.join(AGGREGATES_DIR, 'manifest.json')
+SOURCES = ['country', 'minus_ole', 'pharma_country', 'country_aliases', 'sponsor_aliases']
+
+_lock = threading.Lock()
+# table name -> (mtime_ns, mapped Arrow table)
+_tables = {}
+# stats of everything is_stale() reads, as of its last False
+_fresh = None
+
+
+# columns each source is read with; everything else in the exports is skipped
+COLUMNS = {
+    'country': ['Study population', 'year', 'phase'],
+    'minus_ole': ['source', 'year', 'phase'],
+    'pharma_country': ['source', 'Study population'],
+}
+
+
+def _with_country_codes(df):
+    # canonical country name and ISO numeric code; unknown names become null
+    resolved = countries.lookup(df['Study population'], ['Country', 'country-code'])
+    df = df.drop(columns='Study population')
+    df['Study population'] = resolved['Country']
+    df['country-code'] = resolved['country-code']
+    return df
+
+
+def country_counts(country):
+    # one row per (country, year, phase) with the number of trials
+    trials = _with_country_codes(country[['Study population', 'year', 'phase']])
+    trials = trials.dropna(subset=['Study population', 'country-code', 'year', 'phase'])
+    trials['year'] = trials['year'].astype(int)
+    return (
+        trials.groupby(['Study population', 'country-code', 'year', 'phase'], observed=True)
+        .size()
+        .reset_index(name='totaltrials')
+    )
+
+
+def _sponsor_lookup(lookup):
+    lookup = lookup[['sponsor-id', 'source', 'parent']].reset_index(drop=True)
+    lookup['parent-id'] = sponsors.parent_ids(lookup)
+    return lookup
+
+
+def sponsor_counts(minus_ole, lookup=None):
+    # One row per (sponsor-id, year, phase) with the number of trials, and
+    # the sponsor lookup table including any sponsor new to `lookup`. The
+    # funding views work off the OLE-excluded export.
+    trials = minus_ole[['source', 'year', 'phase']].dropna()
+    ids, lookup = sponsors.encode(trials['source'], lookup)
+    trials = pd.DataFrame({'sponsor-id': ids, 'year': trials['year'].astype(int).to_numpy(), 'phase': trials['phase'].to_numpy()})
+    counts = trials.groupby(['sponsor-id', 'year', 'phase'], observed=True).size().reset_index(name='count')
+    return counts, _sponsor_lookup(lookup)
+
+
+# ingestable dataset -> (table it feeds, key columns, count column)
+DELTAS = {
+    'country': ('country_year_phase', ['Study population', 'country-code', 'year', 'phase'], 'totaltrials'),
+    'minus_ole': ('sponsor_year_phase', ['sponsor-id', 'year', 'phase'], 'count'),
+}
+
+
+def build_tables(country, minus_ole, pharma_country):
+    country_year_phase = country_counts(country)
+    sponsor_year_phase, sponsor_lookup = sponsor_counts(minus_ole)
+
+    # number of distinct pharma companies headquartered in each country
+    pharma = _with_country_codes(pharma_country)
+    pharma['sponsor-id'], sponsor_lookup = sponsors.encode(pharma['source'], sponsor_lookup)
+    sponsor_lookup = _sponsor_lookup(sponsor_lookup)
+    pharma_country_counts = (
+        pharma.groupby(['Study population', 'country-code'], observed=True)['sponsor-id']
+        .nunique()
+        .reset_index(name='count')
+    )
+
+    country_lookup = (
+        country_year_phase[['Study population', 'country-code']]
+        .drop_duplicates()
+        .reset_index(drop=True)
+    )
+
+    return {
+        'country_year_phase': country_year_phase,
+        'sponsor_year_phase': sponsor_year_phase,
+        'pharma_country_counts': pharma_country_counts,
+        'country_lookup': country_lookup,
+        'sponsor_lookup': sponsor_lookup,
+    }
+
+
+def _table_path(name):
+    return os.path.join(AGGREGATES_DIR, name + '.arrow')
+
+
+def _write_table(name, table):
+    mapped.write(table, _table_path(name))
+
+
+def _read_table(name):
+    return mapped.rows(mapped.read(_table_path(name)))
+
+
+def _write_manifest(batches):
+    manifest = {name: datasets.digest(name) for name in SOURCES}
+    manifest['ingested'] = batches
+    tmp = MANIFEST + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, MANIFEST)
+
+
+def build():
+    # the exports plus every ingested batch, from scratch
+    frames = datasets.load_many(COLUMNS)
+    sources = [ingest.with_batches(name, frame, columns) for (name, columns), frame in zip(COLUMNS.items(), frames)]
+    tables = build_tables(*sources)
+    os.makedirs(AGGREGATES_DIR, exist_ok=True)
+    for name, table in tables.items():
+        _write_table(name, table)
+    _write_manifest(ingest.counts())
+    return tables
+
+
+def _read_manifest():
+    try:
+        with open(MANIFEST) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _stale(manifest, batches):
+    if manifest is None or manifest.get('ingested') != batches:
+        return True
+    return any(manifest.get(name) != datasets.digest(name) for name in SOURCES)
+
+
+def is_stale():
+    return _stale(_read_manifest(), ingest.counts())
+
+
+def merge_counts(table, delta, keys, count):
+    # adds delta's counts to table's, row for row on `keys`
+    merged = pd.concat([table, delta], ignore_index=True)
+    for column in keys:
+        if table[column].dtype.name != 'category':
+            merged[column] = merged[column].astype(table[column].dtype)
+    merged = merged.groupby(keys, observed=True, sort=False)[count].sum().reset_index()
+    for column in keys:
+        # concat widens categoricals with different categories to object and
+        # an unsorted groupby orders them by appearance; re-infer them so the
+        # categories stay sorted as in a full build
+        if table[column].dtype.name == 'category':
+            merged[column] = merged[column].astype(object).astype('category')
+    return merged
+
+
+def apply_batch(name, batch):
+    # Folds one just-stored batch into the table it feeds and returns the
+    # batch's counts. Returns None instead when the tables already include
+    # the batch or had to be rebuilt because they missed earlier changes.
+    table_name, keys, count = DELTAS[name]
+    with _lock:
+        batches = ingest.counts()
+        manifest = _read_manifest()
+        if not _stale(manifest, batches):
+            return None
+        before = dict(batches, **{name: batches[name] - 1})
+        if not before[name]:
+            del before[name]
+        if _stale(manifest, before):
+            build()
+            return None
+        if name == 'country':
+            delta = country_counts(batch)
+            lookup = _read_table('country_lookup')
+            lookup = pd.concat([lookup, delta[['Study population', 'country-code']]], ignore_index=True).drop_duplicates()
+            _write_table('country_lookup', lookup.reset_index(drop=True))
+        else:
+            lookup = _read_table('sponsor_lookup')
+            delta, updated = sponsor_counts(batch, lookup)
+            if len(updated) != len(lookup):
+                _write_table('sponsor_lookup', updated)
+        table = _read_table(table_name)
+        _write_table(table_name, merge_counts(table, delta, keys, count))
+        _write_manifest(batches)
+    return delta
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _inputs():
+    # the manifest, the source files and the batch directories: is_stale()
+    # can only change its answer when one of these does
+    paths = [MANIFEST] + [datasets.path(name) for name in SOURCES]
+    paths += [os.path.join(ingest.STORE_DIR, name) for name in ingest.REQUIRED]
+    return tuple(_stat(path) for path in paths)
+
+
+def _cached(name):
+    global _fresh
+    path = _table_path(name)
+    inputs = _inputs()
+    with _lock:
+        fresh = _fresh == inputs
+    # build directories from before the Arrow tables only have parquet
+    if not fresh or not os.path.exists(path):
+        with _lock:
+            if is_stale() or not os.path.exists(path):
+                build()
+            else:
+                _fresh = inputs
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        cached = _tables.get(name)
+    # mapped outside the lock so load_many() reads tables in parallel
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, mapped.read(path))
+        with _lock:
+            _tables[name] = cached
+    return cached
+
+
+def version(name):
+    # changes whenever the table is rebuilt; used to key derived caches
+    return _cached(name)[0]
+
+
+def table(name):
+    # the memory-mapped Arrow table; the views filter it through stages.index_cube()
+    return _cached(name)[1]
+
+
+def load(name):
+    return mapped.rows(_cached(name)[1])
+
+
+def load_many(names, max_workers=4):
+    # several tables at once, read in parallel threads, in the order given
+    if len(names) < 2:
+        return [load(name) for name in names]
+    # build (if stale) once up front rather than racing in every thread
+    version(names[0])
+    with concurrent.futures.ThreadPoolExecutor(min(max_workers, len(names))) as pool:
+        return list(pool.map(load, names))
+
+
+if __name__ == '__main__':
+    for name, table in build().items():
+        print(f'{name}: {len(table)} rows')
+    print(f'written to {AGGREGATES_DIR}', file=sys.stderr)
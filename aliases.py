@@ -0,0 +1,113 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import datasets
+
+# Alias dictionaries compiled for fast lookups (see countries.py and
+# sponsors.py).
+#
+# A dictionary CSV lists every known entity with its attributes and, in an
+# 'aliases' column, the other spellings seen in the data separated by ';'.
+# AliasTable compiles it once into a build directory: the table of entities
+# (<directory name>.parquet), an index from each normalized spelling to the
+# entity's row (aliases.parquet) and the digest of the CSV they came from.
+# Every file is written under a temporary name and renamed into place, the
+# digest last, so a reader never sees a half-written file. Each process
+# keeps the compiled table in memory until the CSV changes.
+#
+# factorize() is the per-distinct-value step the lookups share: they
+# normalize and resolve the categories of a column, then take the result for
+# every row by its code.
+
+
+def factorize(values):
+    # `values` as a pandas Categorical; categorical columns (see schema.py)
+    # are already factorized
+    values = pd.Series(values)
+    return values.array if pd.api.types.is_categorical_dtype(values) else pd.Categorical(values.astype(object))
+
+
+def _write(path, write):
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _write_text(text):
+    def write(path):
+        with open(path, 'w') as f:
+            f.write(text)
+    return write
+
+
+class AliasTable:
+
+    def __init__(self, source, directory, entity, normalize, compile_table, target='position'):
+        # `compile_table(source frame)` returns the entity table and the
+        # canonical name of each of its rows (one row per source row); the
+        # alias index maps normalized spellings to that row in `target`
+        self.source = source
+        self.directory = directory
+        self.entity = entity
+        self.normalize = normalize
+        self.compile_table = compile_table
+        self.target = target
+        # build/countries/countries.parquet, build/sponsors/sponsors.parquet
+        self.table_file = os.path.basename(directory) + '.parquet'
+        self._lock = threading.Lock()
+        # (source digest, table, alias index)
+        self._index = None
+
+    def build(self):
+        source = datasets.load(self.source)
+        digest = datasets.digest(self.source)
+        table, names = self.compile_table(source)
+
+        # every entity is reachable by its canonical name and its aliases
+        extra = source['aliases'].fillna('').str.split(';').explode()
+        extra = extra[extra.str.strip() != '']
+        aliases = pd.DataFrame({
+            'alias': self.normalize(pd.concat([names, extra])).to_numpy(),
+            self.target: np.concatenate([np.arange(len(table)), extra.index.to_numpy()]).astype(np.int32),
+        })
+        targets = aliases.groupby('alias')[self.target].nunique()
+        if (targets > 1).any():
+            raise ValueError(f'aliases map to more than one {self.entity}: {list(targets.index[targets > 1])}')
+        aliases = aliases.drop_duplicates('alias').reset_index(drop=True)
+
+        os.makedirs(self.directory, exist_ok=True)
+        _write(self._path(self.table_file), lambda path: table.to_parquet(path, index=False))
+        _write(self._path('aliases.parquet'), lambda path: aliases.to_parquet(path, index=False))
+        _write(self._path('source.sha1'), _write_text(digest))
+        return table, aliases
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load(self):
+        # the entity table and the alias index, recompiled when the CSV changes
+        current = datasets.digest(self.source)
+        with self._lock:
+            if self._index is not None and self._index[0] == current:
+                return self._index[1], self._index[2]
+            try:
+                with open(self._path('source.sha1')) as f:
+                    built = f.read().strip()
+            except OSError:
+                built = None
+            if built == current:
+                table = pd.read_parquet(self._path(self.table_file))
+                aliases = pd.read_parquet(self._path('aliases.parquet'))
+            else:
+                table, aliases = self.build()
+            alias_index = pd.Series(aliases[self.target].to_numpy(), index=pd.Index(aliases['alias']))
+            self._index = (current, table, alias_index)
+            return table, alias_index
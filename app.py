@@ -0,0 +1,30 @@
+import streamlit as st
+
+import store
+
+# Entry point for all the dashboards as one multipage app:
+#
+#   streamlit run app.py
+#
+# Every page under pages/ runs one of the dashboard scripts. They share one
+# Streamlit process, so the data they show is loaded once and then read by
+# every page and every session from the shared store (see store.py) instead
+# of each script run reading its own copy. The scripts can still be run on
+# their own with `streamlit run task4.py`.
+
+st.set_page_config(page_title='Antiseizure Clinical Trials', layout="wide")
+st.title('Antiseizure Clinical Trials')
+
+st.markdown("""
+Pick a dashboard in the sidebar:
+
+- **Sample trials**: trials by phase, country map and ranking (task1.py)
+- **Country trials**: trials per country over the years and their sponsors (task3.py)
+- **Trials and funding**: country ranking, map and top funding sources by year and phase (task4.py)
+- **Seizure types**: seizure types across age groups and sponsors (Streamlit_matt.py)
+""")
+
+# Load the shared data while the user reads the page, so the first
+# dashboard they open does not wait for it
+data = store.get()
+st.caption(f'{len(data.sample)} sample trials, {len(data.country_year_phase)} country, year and phase totals loaded')
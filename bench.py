@@ -0,0 +1,276 @@
+import os
+
+# benchmarks never touch the network or a display
+os.environ.setdefault('BMI706_OFFLINE', '1')
+import matplotlib
+matplotlib.use('Agg')
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+import aggregates
+import charts
+import datasets
+import mapped
+import schema
+import stages
+import synth
+import year_index
+
+# Headless benchmarks for every dashboard.
+#
+# Each dashboard (task1.py-task4.py, Streamlit_matt.py) is a list of stages
+# (load, filter, aggregate, chart) built from the same functions the
+# Streamlit scripts call. Every stage is timed on the bundled CSVs and on
+# synthetic data scaled 10x, 100x (and 1000x on request), reporting the
+# best wall time and the peak traced memory. With --check the run fails when
+# a stage is slower than the stored baseline.
+#
+#   python bench.py                      # report
+#   python bench.py --save-baseline      # store the current numbers
+#   python bench.py --check              # exit 1 on regressions
+
+BENCH_DIR = os.path.join(datasets.BUILD_DIR, 'bench')
+BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+def scaled_path(name, scale):
+    # `scale` times as many rows as the bundled file, written once per scale:
+    # synthetic trials for the trial exports, plain repetition for the others
+    if scale == 1:
+        return datasets.path(name)
+    target = os.path.join(BENCH_DIR, f'x{scale}', datasets.DATASETS[name]['file'])
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        encoding = schema.SCHEMAS.get(name, {}).get('encoding')
+        raw = pd.read_csv(datasets.path(name), dtype=str, keep_default_na=False, encoding=encoding)
+        if name in synth.TEMPLATES:
+            synth.generate(name, target, len(raw) * scale)
+        else:
+            pd.concat([raw] * scale, ignore_index=True).to_csv(target + '.tmp', index=False, encoding=encoding)
+            os.replace(target + '.tmp', target)
+    return target
+
+
+def read(name, scale, columns=None):
+    return pd.read_csv(scaled_path(name, scale), **schema.read_csv_kwargs(name, columns))
+
+
+def full_range(years):
+    return int(years.min()), int(years.max())
+
+
+# Each pipeline maps a scale to [(stage, function(state) -> dict of new state)].
+
+def task1_pipeline(scale):
+    def load(state):
+        df = read('clinical_trials_sample', scale)
+        # the bitmaps are built once per data load (see store.py)
+        return {'df': df, 'index': stages.sample_bitmaps(df)}
+
+    def filter_(state):
+        df = state['df']
+        phases = df['Phase'].unique().tolist()
+        by_phase = stages.filter_sample(df, state['index'], phases)
+        filtered = stages.filter_sample(df, state['index'], phases, full_range(df['Year']))
+        return {'by_phase': by_phase, 'filtered': filtered}
+
+    def aggregate(state):
+        return {
+            'ranking': stages.sample_ranking(state['by_phase']),
+            'heatmap_data': stages.sample_heatmap_data(state['by_phase']),
+        }
+
+    def chart(state):
+        country = state['ranking']['Country'].iloc[0]
+        filtered = state['filtered']
+        stages.sample_map(stages.sample_map_points(state['ranking'])).to_json()
+        stages.sample_heatmap(state['heatmap_data']).to_dict()
+        stages.sample_country_line(filtered[filtered['Country'] == country]).to_dict()
+        return {}
+
+    return [('load', load), ('filter', filter_), ('aggregate', aggregate), ('chart', chart)]
+
+
+def task2_pipeline(scale):
+    # task2.py draws its own sample, so the scale sets the sample size
+    def load(state):
+        return {'df': stages.company_sample(100 * scale)}
+
+    def aggregate(state):
+        year = stages.COMPANY_YEARS[0]
+        return {
+            'year': year,
+            'summary': stages.company_summary(state['df']),
+            'year_trials': stages.company_year_trials(state['df'], year),
+        }
+
+    def chart(state):
+        stages.company_line(state['summary']).to_dict()
+        stages.company_pie(state['year_trials'], state['year']).to_dict()
+        return {}
+
+    return [('load', load), ('aggregate', aggregate), ('chart', chart)]
+
+
+def country_pipeline(scale, maps, line):
+    def load(state):
+        return {name: read(name, scale, columns) for name, columns in aggregates.COLUMNS.items()}
+
+    def aggregate(state):
+        tables = aggregates.build_tables(*[state[name] for name in aggregates.COLUMNS])
+        return {
+            'tables': tables,
+            # the views filter the cubes as indexed Arrow tables (store.py)
+            'cubes': {name: stages.index_cube(name, mapped.from_frame(tables[name])) for name in ('country_year_phase', 'sponsor_year_phase')},
+            'country_index': year_index.YearRangeIndex(tables['country_year_phase'], ['Study population', 'country-code'], 'totaltrials'),
+            'sponsor_index': year_index.YearRangeIndex(tables['sponsor_year_phase'], 'sponsor-id', 'count'),
+        }
+
+    def filter_(state):
+        index = state['country_index']
+        years = (index.first_year, index.last_year)
+        phases = list(index.phases)
+        totals = stages.country_totals(index, years, phases)
+        cube = state['cubes']['country_year_phase']
+        lookup = state['tables']['sponsor_lookup']
+        return {
+            'totals': totals,
+            'series': stages.country_series(cube, totals['Study population'].iloc[0], years, phases),
+            'top_funding': stages.top_funding(state['sponsor_index'], years, phases, lookup),
+            'funding_summary': stages.funding_summary(state['cubes']['sponsor_year_phase'], years, phases, lookup),
+        }
+
+    def chart(state):
+        # measure a cold build, not a spec cache hit
+        charts.clear()
+        maps(state['totals'], state['tables']['pharma_country_counts'])
+        line(state['series']).to_dict()
+        stages.funding_chart(state['top_funding'], state['funding_summary']).to_dict()
+        return {}
+
+    return [('load', load), ('aggregate', aggregate), ('filter', filter_), ('chart', chart)]
+
+
+def task3_pipeline(scale):
+    return country_pipeline(scale, stages.country_maps_task3, stages.country_line_task3)
+
+
+def task4_pipeline(scale):
+    return country_pipeline(scale, stages.country_maps_task4, stages.country_line_task4)
+
+
+def matt_pipeline(scale):
+    def load(state):
+        data = read('minus_ole_generalized', scale, ['Age Group', 'indication_gen', 'source'])
+        return {'data': data, 'index': stages.seizure_bitmaps(data)}
+
+    def filter_(state):
+        return {'selected': stages.seizure_rows(state['data'], state['index'], None, stages.SEIZURE_TYPES)}
+
+    def aggregate(state):
+        return {
+            'age_counts': stages.seizure_age_counts(state['selected']),
+            'sponsor_counts': stages.sponsor_counts(state['selected']),
+        }
+
+    def chart(state):
+        import io
+
+        import matplotlib.pyplot as plt
+
+        fig = stages.seizure_age_figure(state['age_counts'])
+        fig.savefig(io.BytesIO(), format='png')
+        plt.close(fig)
+        stages.sponsor_waterfall(state['sponsor_counts']).to_json()
+        return {}
+
+    return [('load', load), ('filter', filter_), ('aggregate', aggregate), ('chart', chart)]
+
+
+PIPELINES = {
+    'task1': task1_pipeline,
+    'task2': task2_pipeline,
+    'task3': task3_pipeline,
+    'task4': task4_pipeline,
+    'Streamlit_matt': matt_pipeline,
+}
+
+
+def run_stage(function, state, repeat):
+    # one untimed call first so file generation and warm-up are not measured
+    function(state)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(state)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    function(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def run(dashboards, scales, repeat):
+    results = {}
+    for scale in scales:
+        for dashboard in dashboards:
+            state = {}
+            for stage, function in PIPELINES[dashboard](scale):
+                result, seconds, peak = run_stage(function, state, repeat)
+                state.update(result)
+                key = f'{dashboard}/{stage}@x{scale}'
+                results[key] = {'seconds': seconds, 'peak_mb': peak / 2**20}
+                print(f'{key:<32} {seconds * 1000:10.1f} ms {peak / 2**20:10.1f} MB', flush=True)
+    return results
+
+
+def regressions(results, baseline, tolerance, floor):
+    # stages slower than baseline * (1 + tolerance), ignoring differences below `floor` seconds
+    failed = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        allowed = baseline[key]['seconds'] * (1 + tolerance)
+        if result['seconds'] > allowed and result['seconds'] - baseline[key]['seconds'] > floor:
+            failed.append((key, baseline[key]['seconds'], result['seconds']))
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the load, filter, aggregate and chart stages of every dashboard.')
+    parser.add_argument('--dashboards', nargs='+', choices=list(PIPELINES), default=list(PIPELINES))
+    parser.add_argument('--scales', nargs='+', type=int, default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed slowdown as a fraction of the baseline')
+    parser.add_argument('--floor', type=float, default=0.005, help='ignore slowdowns smaller than this many seconds')
+    args = parser.parse_args(argv)
+
+    results = run(args.dashboards, args.scales, args.repeat)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'baseline written to {args.baseline}')
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failed = regressions(results, baseline, args.tolerance, args.floor)
+        for key, before, after in failed:
+            print(f'REGRESSION {key}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms')
+        return 1 if failed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+import aliases
+
+# Bitmap indexes for the multiselect filters.
+#
+# For every indexed column, each distinct value has a packed bitmap with one
+# bit per row (8 rows per byte), built once when the data is loaded. A
+# selection of values is the OR of their bitmaps and filters on several
+# columns are ANDed, so a filter costs (number of selected values) x
+# (rows / 8) bytes of bitwise work instead of a string comparison per row.
+# The year column is kept as row positions sorted by year: a year range is
+# a slice of that order, turned into a bitmap and ANDed with the rest.
+#
+# where() takes {column: value} equalities, a {year column: (low, high)}
+# range and {column: values} memberships and returns a bitmap (None for no
+# condition); rows() turns it into sorted row positions. IndexedTable
+# pairs an Arrow table (see mapped.py) with its index so the views can take
+# just the matching rows.
+
+
+def _codes(values):
+    # distinct values and each row's position among them (-1 for missing)
+    categorical = aliases.factorize(values)
+    return pd.Index(categorical.categories), np.asarray(categorical.codes)
+
+
+class BitmapIndex:
+
+    def __init__(self, columns, year=None, year_column='year'):
+        # `columns` maps a column name to its values (anything with one
+        # value per row); `year` is the year of every row
+        self._bitmaps = {}
+        self.n_rows = None
+        for name, values in columns.items():
+            distinct, codes = _codes(values)
+            self._set_rows(len(codes))
+            rows = np.flatnonzero(codes >= 0)
+            bitmaps = np.zeros((len(distinct), self.n_bytes), dtype=np.uint8)
+            np.bitwise_or.at(bitmaps, (codes[rows], rows >> 3), (1 << (rows & 7)).astype(np.uint8))
+            self._bitmaps[name] = (distinct, bitmaps)
+
+        self.year_column = year_column if year is not None else None
+        if year is not None:
+            years = pd.Series(year).to_numpy(dtype=float, na_value=np.nan)
+            self._set_rows(len(years))
+            known = np.flatnonzero(~np.isnan(years))
+            order = np.argsort(years[known], kind='stable')
+            self._year_rows = known[order]
+            self._years = years[known][order]
+
+    def _set_rows(self, n_rows):
+        if self.n_rows is not None and n_rows != self.n_rows:
+            raise ValueError(f'columns have {self.n_rows} and {n_rows} rows')
+        self.n_rows = n_rows
+        self.n_bytes = (n_rows + 7) // 8
+
+    def values(self, column):
+        return self._bitmaps[column][0]
+
+    def positions(self, rows):
+        # bitmap of the given row positions
+        bits = np.zeros(self.n_rows, dtype=bool)
+        bits[rows] = True
+        return np.packbits(bits, bitorder='little')
+
+    def any_of(self, column, values):
+        # bitmap of the rows whose `column` is one of `values`
+        distinct, bitmaps = self._bitmaps[column]
+        found = distinct.get_indexer(pd.Index(list(values)))
+        found = found[found >= 0]
+        if not len(found):
+            return np.zeros(self.n_bytes, dtype=np.uint8)
+        return np.bitwise_or.reduce(bitmaps[found], axis=0)
+
+    def year_range(self, low, high):
+        # bitmap of the rows with low <= year <= high
+        start = np.searchsorted(self._years, low, 'left')
+        stop = np.searchsorted(self._years, high, 'right')
+        return self.positions(self._year_rows[start:stop])
+
+    def where(self, equal=None, between=None, isin=None):
+        # Bitmap for {column: value} equalities, a {year column: (low, high)}
+        # inclusive range and {column: values} memberships, all combined;
+        # None when there is no condition
+        conditions = []
+        for column, value in (equal or {}).items():
+            conditions.append(self.any_of(column, [value]))
+        for column, (low, high) in (between or {}).items():
+            if column != self.year_column:
+                raise KeyError(f'{column} has no range index')
+            conditions.append(self.year_range(low, high))
+        for column, values in (isin or {}).items():
+            conditions.append(self.any_of(column, values))
+        mask = None
+        for condition in conditions:
+            mask = condition if mask is None else np.bitwise_and(mask, condition)
+        return mask
+
+    def rows(self, mask):
+        # sorted row positions set in `mask` (every row for None)
+        if mask is None:
+            return np.arange(self.n_rows)
+        return np.flatnonzero(np.unpackbits(mask, count=self.n_rows, bitorder='little'))
+
+
+class IndexedTable:
+
+    def __init__(self, table, columns, year='year', extra=None):
+        # `table` is an Arrow table; `extra` adds indexed columns that are
+        # not in the table, such as values derived from one of its columns
+        self.table = table
+        indexed = {column: table.column(column).to_pandas() for column in columns}
+        indexed.update(extra or {})
+        self.index = BitmapIndex(indexed, table.column(year).to_numpy(), year)
+
+    @property
+    def schema(self):
+        return self.table.schema
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def rows(self, equal=None, between=None, isin=None, columns=None):
+        # pandas frame of the matching rows and the given columns only
+        table = self.table if columns is None else self.table.select(list(columns))
+        mask = self.index.where(equal=equal, between=between, isin=isin)
+        if mask is not None:
+            table = table.take(self.index.rows(mask))
+        return table.to_pandas()
@@ -0,0 +1,270 @@
+import collections
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import urllib.request
+
+import pandas as pd
+
+import datasets
+
+# Cached Vega-Lite specs for the choropleth maps in task3.py and task4.py.
+#
+# Building the vconcat of geoshape layers and serializing it with altair costs
+# far more than the lookup tables behind it, so finished spec dicts are kept in
+# a process-wide LRU cache keyed by the data they show and the chart options.
+# The lookup tables are attached as named top-level datasets ("trials" and
+# "pharma") that every layer references, so each is sent once per chart and
+# keeps a stable name between reruns. Streamlit ships top-level datasets to
+# the browser as Arrow tables rather than inlined JSON.
+#
+# The topology is only ever referenced by URL: Streamlit converts every
+# top-level dataset into a table, which a topojson document is not. The URL
+# is static/world-110m.json, served by the Streamlit server itself
+# (server.enableStaticServing in .streamlit/config.toml), so browsers never
+# fetch it from a CDN. A checkout without the file downloads it once on the
+# server (`python charts.py topology`, or on first use unless BMI706_OFFLINE
+# is set). BMI706_TOPOLOGY_URL overrides the URL.
+#
+# Rendered matplotlib and plotly figures (PNG bytes, figure JSON) go in a
+# second LRU cache bounded by their total size, BMI706_FIGURE_CACHE_MB.
+
+TOPOLOGY_URL = os.environ.get('BMI706_TOPOLOGY_URL')
+TOPOLOGY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'world-110m.json')
+# where Streamlit serves static/ (relative to the app's base URL)
+STATIC_TOPOLOGY_URL = 'app/static/world-110m.json'
+TOPOLOGY_SOURCE = 'https://cdn.jsdelivr.net/npm/vega-datasets@v1.29.0/data/world-110m.json'
+CACHE_SIZE = 64
+FIGURE_CACHE_BYTES = int(float(os.environ.get('BMI706_FIGURE_CACHE_MB', '32')) * 2**20)
+
+
+class SpecCache:
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        spec = build()
+        with self._lock:
+            self._entries[key] = spec
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return spec
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FigureCache:
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render):
+        # render() returns bytes or str; entries larger than the whole cache are not kept
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        value = render()
+        size = len(value.encode() if isinstance(value, str) else value)
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self.bytes -= self._entries.popitem(last=False)[1][1]
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+_maps = SpecCache(CACHE_SIZE)
+_figures = FigureCache(FIGURE_CACHE_BYTES)
+
+
+def clear():
+    _maps.clear()
+    _figures.clear()
+
+
+def figure(key, render):
+    # Cached rendered figure: `key` must identify the input data and the
+    # normalized selection, render() returns PNG bytes or figure JSON.
+    return _figures.get(key, render)
+
+
+def _frame_key(df):
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()
+
+
+_topology_lock = threading.Lock()
+
+
+def fetch_topology():
+    # downloads the topology into static/ unless it is already there
+    with _topology_lock:
+        if not os.path.exists(TOPOLOGY_FILE):
+            os.makedirs(os.path.dirname(TOPOLOGY_FILE), exist_ok=True)
+            tmp = TOPOLOGY_FILE + '.part'
+            with urllib.request.urlopen(TOPOLOGY_SOURCE) as response, open(tmp, 'wb') as out:
+                shutil.copyfileobj(response, out)
+            os.replace(tmp, TOPOLOGY_FILE)
+    return TOPOLOGY_FILE
+
+
+def topology_url():
+    if TOPOLOGY_URL:
+        return TOPOLOGY_URL
+    if not os.path.exists(TOPOLOGY_FILE) and not datasets.OFFLINE:
+        try:
+            fetch_topology()
+        except OSError as error:
+            print(f'world topology not available: {error}; run `python charts.py topology` where the network is reachable', file=sys.stderr)
+    return STATIC_TOPOLOGY_URL
+
+
+def _country_layer(source, dataset, value, scheme, domain_max, tooltip, title, selector, width, height, project):
+    import altair as alt
+
+    return alt.Chart(source
+    ).properties(
+        width=width,
+        height=height
+    ).project(project
+    ).add_selection(selector
+    ).transform_lookup(
+        lookup="id",
+        from_=alt.LookupData(alt.NamedData(name=dataset), "country-code", ["Study population", value]),
+    ).mark_geoshape().encode(
+        color=alt.Color(field=value, type="quantitative", scale=alt.Scale(domain=[0, domain_max], scheme=scheme)),
+        tooltip=tooltip
+    ).transform_filter(selector
+    ).properties(
+        title=title
+    )
+
+
+def build_country_maps(trials, pharma, width, height, trials_title, pharma_title, country_label=None, pharma_label=None):
+    # trials: Study population, country-code, totaltrials
+    # pharma: Study population, country-code, count
+    # country_label/pharma_label: tooltip titles, None for altair's default
+    import altair as alt
+
+    country_label = alt.Undefined if country_label is None else country_label
+    pharma_label = alt.Undefined if pharma_label is None else pharma_label
+    project = 'equirectangular'
+    source = alt.topo_feature(topology_url(), 'countries')
+
+    # a gray map using as the visualization background
+    background = alt.Chart(source
+    ).mark_geoshape(
+        fill='#aaa',
+        stroke='white'
+    ).properties(
+        width=width,
+        height=height
+    ).project(project)
+
+    selector = alt.selection_single(fields=['Study population'], on='click', empty="all", clear='dblclick')
+
+    chart_rate = _country_layer(
+        source, 'trials', 'totaltrials', 'oranges', int(trials['totaltrials'].max() if len(trials) else 0),
+        [alt.Tooltip('Study population:N', title=country_label), alt.Tooltip('totaltrials:Q')],
+        trials_title, selector, width, height, project,
+    )
+    pharma_chart_rate = _country_layer(
+        source, 'pharma', 'count', 'yellowgreenblue', int(pharma['count'].max() if len(pharma) else 0),
+        [alt.Tooltip('Study population:N', title=country_label), alt.Tooltip('count:Q', title=pharma_label)],
+        pharma_title, selector, width, height, project,
+    )
+
+    chart = alt.vconcat(background + chart_rate, background + pharma_chart_rate
+    ).resolve_scale(
+        color='independent'
+    )
+    spec = chart.to_dict()
+    spec['datasets'] = {
+        'trials': trials[['Study population', 'country-code', 'totaltrials']].reset_index(drop=True),
+        'pharma': pharma[['Study population', 'country-code', 'count']].reset_index(drop=True),
+    }
+    return spec
+
+
+def country_maps(trials, pharma, width, height, trials_title, pharma_title, country_label=None, pharma_label=None):
+    # Cached build_country_maps(); render the result with st.vega_lite_chart.
+    # The returned dict is shared, so callers must not modify it.
+    key = (_frame_key(trials), _frame_key(pharma), width, height, trials_title, pharma_title, country_label, pharma_label)
+    return _maps.get(key, lambda: build_country_maps(trials, pharma, width, height, trials_title, pharma_title, country_label, pharma_label))
+
+
+def payload_bytes(spec):
+    # bytes Streamlit sends for a spec: the JSON body plus one Arrow table per dataset
+    import pyarrow as pa
+
+    body = {key: value for key, value in spec.items() if key != 'datasets'}
+    total = len(json.dumps(body).encode())
+    for frame in spec.get('datasets', {}).values():
+        if isinstance(frame, pd.DataFrame):
+            sink = io.BytesIO()
+            table = pa.Table.from_pandas(frame)
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            total += len(sink.getvalue())
+        else:
+            total += len(json.dumps(frame).encode())
+    return total
+
+
+if __name__ == '__main__' and sys.argv[1:] == ['topology']:
+    print(f'world topology at {fetch_topology()}')
+elif __name__ == '__main__':
+    import aggregates
+    import year_index
+
+    index = year_index.load('country_year_phase', ['Study population', 'country-code'], 'totaltrials')
+    trials = index.top(None, (index.first_year, index.last_year)).reset_index(name='totaltrials')
+    pharma = aggregates.load('pharma_country_counts')
+    options = (600, 500, 'Trials count by country', 'Funding count by country', 'Country', 'Number of funding')
+
+    start = time.perf_counter()
+    spec = build_country_maps(trials, pharma, *options)
+    build_ms = (time.perf_counter() - start) * 1000
+    country_maps(trials, pharma, *options)
+    start = time.perf_counter()
+    for _ in range(100):
+        country_maps(trials, pharma, *options)
+    hit_ms = (time.perf_counter() - start) * 10
+
+    print(f'spec build: {build_ms:.1f} ms, cache hit: {hit_ms:.2f} ms')
+    print(f'payload: {payload_bytes(spec)} bytes')
@@ -0,0 +1,90 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import aliases
+import datasets
+
+# Country name normalization.
+#
+# country_aliases.csv lists every country the exports mention with its ISO
+# numeric code, continent, centroid and the alternative spellings found in
+# the data ("USA", "Russia", "Czech Republicia", ...). It is compiled once into
+# build/countries: a table of canonical countries plus an alias index mapping
+# each normalized spelling to a row of that table. Lookups only normalize the
+# distinct names of the input and then take rows by integer position, so there
+# is no join per rerun, and names that cannot be resolved are reported instead
+# of silently dropped.
+
+COUNTRIES_DIR = os.path.join(datasets.BUILD_DIR, 'countries')
+ATTRIBUTES = ['Country', 'country-code', 'Continent', 'Latitude', 'Longitude']
+
+
+def normalize(names):
+    # case, surrounding and repeated whitespace do not distinguish countries
+    return pd.Series(names, dtype=object).str.strip().str.casefold().str.replace(r'\s+', ' ', regex=True)
+
+
+def _compile(source):
+    table = source[ATTRIBUTES].reset_index(drop=True)
+    table['country-code'] = table['country-code'].astype('int16')
+    return table, table['Country']
+
+
+# compiled into build/countries (see aliases.py)
+_table = aliases.AliasTable('country_aliases', COUNTRIES_DIR, 'country', normalize, _compile)
+
+
+def build():
+    return _table.build()
+
+
+def _load():
+    return _table.load()
+
+
+def countries():
+    return _load()[0].copy()
+
+
+def positions(names):
+    # row of countries() for every name, -1 where the name is not a known country
+    _, alias_index = _load()
+    values = aliases.factorize(names)
+    resolved = alias_index.reindex(normalize(values.categories).to_numpy()).fillna(-1).to_numpy(dtype=np.int32)
+    resolved = np.append(resolved, -1)
+    # code -1 (missing value) picks the trailing -1
+    return resolved[values.codes]
+
+
+def lookup(names, columns=ATTRIBUTES):
+    # country attributes aligned with `names`; unmatched names get nulls
+    table, _ = _load()
+    rows = positions(names)
+    matched = rows >= 0
+    result = table[list(columns)].iloc[np.where(matched, rows, 0)].reset_index(drop=True)
+    if 'country-code' in result:
+        result['country-code'] = result['country-code'].astype('Int16')
+    if not matched.all():
+        result.loc[~matched, :] = np.nan
+    if isinstance(names, pd.Series):
+        result.index = names.index
+    return result
+
+
+def unmatched(names):
+    names = pd.Series(names, dtype=object).dropna()
+    return sorted(names[positions(names) < 0].unique())
+
+
+if __name__ == '__main__':
+    table, spellings = build()
+    print(f'{len(table)} countries, {len(spellings)} spellings written to {COUNTRIES_DIR}')
+    for name in sys.argv[1:] or ['country', 'minus_ole', 'minus_ole_generalized', 'pharma_country']:
+        column = 'Country' if name == 'clinical_trials_sample' else 'Study population'
+        # multi-country cells list one country per line
+        names = datasets.load(name, [column])[column].astype(object).str.split('\n').explode().str.strip()
+        missing = unmatched(names[names != ''])
+        print(f"{name}: {len(missing)} unmatched: {', '.join(repr(n) for n in missing)}")
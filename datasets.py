@@ -0,0 +1,198 @@
+import concurrent.futures
+import glob
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import urllib.request
+
+import pandas as pd
+
+import mapped
+import schema
+
+# Shared data access for the dashboards.
+#
+# Every dataset is resolved to a local file (BMI706_DATA_DIR if set, then the
+# CSVs checked into this repo, then a copy downloaded once into the build
+# directory), parsed once and kept in a process-wide cache keyed by the file's
+# content hash. Streamlit reruns and new sessions reuse the parsed frame, and a
+# file is only re-read when its contents actually change. Column types come
+# from schema.py. load_many() parses independent datasets concurrently.
+#
+# A CSV is parsed only once per version across processes too: the first
+# reader converts it to an Arrow IPC file in build/arrow named after its
+# content hash, and every process, including other server workers, maps that
+# file instead of parsing (see mapped.py). `python datasets.py` converts the
+# trial exports ahead of time.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get('BMI706_DATA_DIR')
+BUILD_DIR = os.environ.get('BMI706_BUILD_DIR', os.path.join(REPO_DIR, 'build'))
+# set BMI706_OFFLINE=1 to never touch the network, e.g. for benchmarks
+OFFLINE = os.environ.get('BMI706_OFFLINE', '') not in ('', '0')
+
+BASE_URL = 'https://raw.githubusercontent.com/wyeekong/bmi706brainstorm/main/'
+
+DATASETS = {
+    'clinical_trials_sample': {
+        'file': 'clinical_trials_sample_dataset.csv',
+        'url': BASE_URL + 'clinical_trials_sample_dataset.csv',
+    },
+    'country': {
+        'file': 'country.csv',
+        'url': BASE_URL + 'country.csv',
+    },
+    'pharma_country': {
+        'file': 'pharma_country.csv',
+        'url': BASE_URL + 'pharma_country.csv',
+    },
+    'minus_ole': {
+        'file': 'minus OLE (deleted 4).csv',
+        'url': BASE_URL + 'minus%20OLE%20(deleted%204).csv',
+    },
+    'minus_ole_generalized': {
+        'file': 'minus_OLE_with_generalized_indications_age_groups.csv',
+        'url': BASE_URL + 'minus_OLE_with_generalized_indications_age_groups.csv',
+    },
+    'country_aliases': {
+        'file': 'country_aliases.csv',
+        'url': BASE_URL + 'country_aliases.csv',
+    },
+    'sponsor_aliases': {
+        'file': 'sponsor_aliases.csv',
+        'url': BASE_URL + 'sponsor_aliases.csv',
+    },
+    'drug_aliases': {
+        'file': 'drug_aliases.csv',
+        'url': BASE_URL + 'drug_aliases.csv',
+    },
+}
+
+ARROW_DIR = os.path.join(BUILD_DIR, 'arrow')
+# converted by `python datasets.py` when no names are given
+CONVERT = ['country', 'pharma_country', 'minus_ole', 'minus_ole_generalized']
+
+_lock = threading.Lock()
+# path -> (mtime_ns, size, digest), so an unchanged file is never re-hashed
+_digests = {}
+# (name, columns, digest) -> parsed DataFrame
+_frames = {}
+# name -> Arrow file last mapped, released from mapped.py's cache when the
+# dataset changes
+_mapped_paths = {}
+
+
+def path(name):
+    spec = DATASETS[name]
+    candidates = []
+    if DATA_DIR:
+        candidates.append(os.path.join(DATA_DIR, spec['file']))
+    candidates.append(os.path.join(REPO_DIR, spec['file']))
+    candidates.append(os.path.join(BUILD_DIR, 'downloads', spec['file']))
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    if OFFLINE:
+        raise FileNotFoundError(f"{spec['file']} is not available locally and BMI706_OFFLINE is set")
+    return _download(spec['url'], candidates[-1])
+
+
+def _download(url, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = target + '.part'
+    with urllib.request.urlopen(url) as response, open(tmp, 'wb') as out:
+        shutil.copyfileobj(response, out)
+    os.replace(tmp, target)
+    return target
+
+
+def digest(name):
+    file_path = path(name)
+    stat = os.stat(file_path)
+    with _lock:
+        cached = _digests.get(file_path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+    sha = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    value = sha.hexdigest()
+    with _lock:
+        _digests[file_path] = (stat.st_mtime_ns, stat.st_size, value)
+    return value
+
+
+def arrow_path(name):
+    return os.path.join(ARROW_DIR, f'{name}-{digest(name)[:12]}.arrow')
+
+
+def convert(name):
+    # parses the whole CSV once and writes it as an Arrow IPC file; older
+    # versions are removed (processes still mapping them keep their copy)
+    target = arrow_path(name)
+    frame = pd.read_csv(path(name), **schema.read_csv_kwargs(name))
+    mapped.write(frame, target)
+    for old in glob.glob(os.path.join(ARROW_DIR, f'{name}-*.arrow')):
+        if old != target:
+            os.remove(old)
+    return target
+
+
+def table(name, columns=None):
+    # the dataset as a memory-mapped Arrow table, converted on first use;
+    # `columns` are kept in file order, as read_csv(usecols=...) does
+    target = arrow_path(name)
+    if not os.path.exists(target):
+        convert(name)
+    table = mapped.read(target)
+    with _lock:
+        previous = _mapped_paths.get(name)
+        _mapped_paths[name] = target
+    if previous is not None and previous != target:
+        mapped.forget(previous)
+    if columns is None:
+        return table
+    missing = [column for column in columns if column not in table.column_names]
+    if missing:
+        raise ValueError(f'{name} has no columns {missing}')
+    return table.select([column for column in table.column_names if column in columns])
+
+
+def load(name, columns=None):
+    # Only `columns` are turned into a frame when given, so each view pays
+    # for what it uses. Every caller gets the same cached frame, backed by
+    # the mapped file where the dtypes allow (see mapped.rows): derive new
+    # frames from it (assign, concat, astype) instead of changing it.
+    columns = tuple(columns) if columns is not None else None
+    key = (name, columns, digest(name))
+    with _lock:
+        frame = _frames.get(key)
+    if frame is None:
+        frame = mapped.rows(table(name, columns))
+        with _lock:
+            # drop frames parsed from older versions of the same file
+            for old in [k for k in _frames if k[0] == name and k[1] == columns and k != key]:
+                del _frames[old]
+            # a thread that parsed the same version first wins
+            frame = _frames.setdefault(key, frame)
+    return frame
+
+
+def load_many(requests, max_workers=4):
+    # {name: columns or None} -> frames in the same order, parsed in parallel
+    # threads (the CSV parser and the hashing release the GIL for most of
+    # their work)
+    requests = list(requests.items())
+    if len(requests) < 2:
+        return [load(name, columns) for name, columns in requests]
+    with concurrent.futures.ThreadPoolExecutor(min(max_workers, len(requests))) as pool:
+        return list(pool.map(lambda request: load(*request), requests))
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or CONVERT:
+        target = convert(name)
+        print(f'{name}: {os.path.getsize(target) / 2**20:.1f} MB written to {target}')
@@ -0,0 +1,331 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+import ages
+import aliases
+import countries
+import datasets
+import schema
+
+# Every trial export variant from one master export, in one streaming pass.
+#
+# The master has one row per trial in the layout of the generalized export
+# (ID, indication_sp, source2, ...). It is read in chunks of --chunk-size
+# rows, so memory stays bounded whatever its size, and each chunk goes
+# through the same declared, vectorized transforms before it is appended to
+# every variant:
+#
+# - open-label extension studies are excluded by their title (OLE);
+# - completion dates in any of the export formats (12/1/1990, 12/1/90,
+#   Jun-00 and the Excel-mangled 0-Jun) become M/D/YYYY, 'year' comes from
+#   the date where there is one, and the 1900 placeholder year is dropped;
+# - indication_gen is derived from indication_sp (INDICATIONS), and 'Age
+#   Group' from the eligible ages (see ages.py), keeping the master's value
+#   only where no rule applies;
+# - Study population is resolved to canonical country names (see
+#   countries.py), with 'Continent' taken from the countries; the
+#   hand-coded 'Country' region code is kept as it is.
+#
+# Each variant is written by a pyarrow CSV writer kept open for the whole
+# pass. The variants are written under the file names datasets.py looks for, so
+# pointing BMI706_DATA_DIR at the output directory makes every dashboard
+# read them. With --check each variant is compared with the bundled export:
+# its trials, and per trial the derived columns (CHECKED).
+#
+#   python etl.py build/etl --check
+#   python etl.py build/etl --master build/synth/master.csv --chunk-size 200000
+
+# variant -> column renames, master columns left out and row layout
+VARIANTS = {
+    'minus_ole_generalized': {'rename': {}, 'drop': [], 'per_country_rows': False},
+    'minus_ole': {
+        'rename': {'ID': 'Gender'},
+        'drop': ['indication_sp', 'indication_gen', 'Age Group'],
+        'per_country_rows': False,
+    },
+    # one row per trial and country, numbered like the trial's row in minus_ole
+    'country': {
+        'rename': {'ID': 'Gender', 'source2': 'source.1'},
+        'drop': ['indication_sp', 'indication_gen', 'Age Group', 'Unnamed: 26', 'Unnamed: 27'],
+        'per_country_rows': True,
+        'trial_number': 'Unnamed: 0',
+    },
+}
+MASTER = 'minus_ole_generalized'
+REQUIRED = ['ID', 'official_title', 'completion_month_year', 'year', 'Study population']
+
+# a title that describes an open-label extension study, unless the extension
+# is only a later phase of the trial ("... followed by an open-label extension")
+OLE = r'(?i)\bopen[- ]label\b.*\bextension (?:study|trial)\b'
+OLE_PHASE = r'(?i)\b(?:with|followed by) an? (?:open-label |OL )?extension\b'
+
+# first matching rule wins; a specific indication naming both focal and
+# generalized seizures is generic
+INDICATIONS = [
+    (r'(?i)healthy', 'Healthy Controls'),
+    (r'(?i)(?=.*(?:partial|focal|locali[sz]ation))(?=.*generali[sz])', 'Epilepsy/Seizures/Status'),
+    (r'(?i)partial|focal|locali[sz]ation', 'Focal/Partial'),
+    (r'(?i)generali[sz]|tonic.clonic|myoclonic', 'Generalized'),
+    (r'(?i)epilep|seiz|status', 'Epilepsy/Seizures/Status'),
+]
+
+MONTHS = {month: number for number, month in enumerate(['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)}
+DATES = {
+    # M/D/YYYY and M/D/YY
+    'numeric': r'^(?P<month>\d{1,2})/(?P<day>\d{1,2})/(?P<year>\d{2}|\d{4})$',
+    # Jun-00
+    'month_year': r'^(?P<month>[A-Za-z]{3})-(?P<year>\d{2})$',
+    # 0-Jun, Jun-00 after a round trip through Excel
+    'year_month': r'^(?P<year>\d{1,2})-(?P<month>[A-Za-z]{3})$',
+}
+# two-digit years below this are 20YY
+PIVOT = 50
+PLACEHOLDER_YEAR = 1900
+MISSING = ['', 'NA', 'N/A']
+
+
+def master_columns():
+    return list(pd.read_csv(datasets.path(MASTER), nrows=0).columns)
+
+
+def _missing(values):
+    return values.isna() | values.str.strip().isin(MISSING)
+
+
+def _distinct(values):
+    # the distinct values and each row's position among them; missing values
+    # get the position one past the last, where callers append an empty result
+    categorical = aliases.factorize(values)
+    codes = np.where(categorical.codes < 0, len(categorical.categories), categorical.codes)
+    return pd.Series(categorical.categories, dtype=object), codes
+
+
+def _parse_dates(text):
+    text = text.str.strip()
+    parsed = pd.DataFrame({'year': np.nan, 'month': np.nan, 'day': np.nan}, index=text.index)
+    for pattern in DATES.values():
+        found = text.str.extract(pattern)
+        hit = found['year'].notna() & parsed['year'].isna()
+        if not hit.any():
+            continue
+        month = found['month'].str.casefold().map(MONTHS).fillna(pd.to_numeric(found['month'], errors='coerce'))
+        day = pd.to_numeric(found['day'], errors='coerce') if 'day' in found else pd.Series(1.0, index=text.index)
+        year = pd.to_numeric(found['year'], errors='coerce')
+        short = found['year'].str.len() <= 2
+        year = year.mask(short & (year < PIVOT), year + 2000).mask(short & (year >= PIVOT), year + 1900)
+        parsed.loc[hit, 'year'] = year[hit]
+        parsed.loc[hit, 'month'] = month[hit]
+        parsed.loc[hit, 'day'] = day.fillna(1)[hit]
+    bad = (parsed['month'] < 1) | (parsed['month'] > 12) | (parsed['day'] < 1) | (parsed['day'] > 31)
+    parsed.loc[bad] = np.nan
+    return parsed
+
+
+def parse_dates(values):
+    # year, month and day of each completion date (NaN when not understood),
+    # parsed once per distinct date
+    values = pd.Series(values)
+    distinct, codes = _distinct(values)
+    parsed = np.vstack([_parse_dates(distinct).to_numpy(dtype=float), [np.nan] * 3])[codes]
+    return pd.DataFrame(parsed, columns=['year', 'month', 'day'], index=values.index)
+
+
+def _text(numbers):
+    # integers as text, '' where missing
+    numbers = pd.Series(numbers)
+    return numbers.astype('Int64').astype(str).where(numbers.notna(), '')
+
+
+def generalize(indications):
+    # indication_gen for each indication_sp (None where no rule applies),
+    # matched once per distinct value
+    distinct, codes = _distinct(indications)
+    labels = pd.Series(None, index=distinct.index, dtype=object)
+    for pattern, label in INDICATIONS:
+        labels = labels.mask(labels.isna() & distinct.str.contains(pattern), label)
+    return np.append(labels.to_numpy(), None)[codes]
+
+
+def is_extension(titles):
+    distinct, codes = _distinct(titles)
+    extension = distinct.str.contains(OLE) & ~distinct.str.contains(OLE_PHASE)
+    return np.append(extension.to_numpy(dtype=bool), False)[codes]
+
+
+def _populations(values):
+    # For each distinct Study population: its countries by canonical name
+    # where known (one row each, in listed order, with their continent), the
+    # names joined back into one cell and their distinct continents joined
+    distinct, codes = _distinct(values)
+    names = distinct.str.split('\n').explode().str.strip()
+    names = names[~_missing(names)]
+    resolved = countries.lookup(names, ['Country', 'Continent'])
+    listed = pd.DataFrame({
+        'value': names.index.to_numpy(),
+        'Study population': resolved['Country'].astype(object).fillna(names).to_numpy(),
+        'Continent': resolved['Continent'].astype(object).to_numpy(),
+    }).drop_duplicates(['value', 'Study population']).sort_values('value', kind='stable').reset_index(drop=True)
+    joined = listed.groupby('value')['Study population'].agg('\n'.join).reindex(np.arange(len(distinct) + 1))
+    continents = listed.dropna(subset=['Continent']).drop_duplicates(['value', 'Continent'])
+    continents = continents.groupby('value')['Continent'].agg('\n'.join).reindex(np.arange(len(distinct) + 1))
+    return listed, joined.to_numpy(), continents.to_numpy(), codes
+
+
+def transform(chunk):
+    # The master rows of one chunk, cleaned, and one row per trial and
+    # country: (trials, rows) where rows has the trial's position in trials
+    chunk = chunk.copy()
+    chunk['ID'] = chunk['ID'].str.strip()
+    chunk = chunk[~_missing(chunk['ID'])]
+    chunk = chunk[~is_extension(chunk['official_title'])].reset_index(drop=True)
+
+    dates = parse_dates(chunk['completion_month_year'])
+    year = dates['year'].fillna(pd.to_numeric(chunk['year'], errors='coerce'))
+    year = year.mask(year == PLACEHOLDER_YEAR)
+    dates = dates.where(dates['year'] != PLACEHOLDER_YEAR)
+    chunk['completion_month_year'] = (_text(dates['month']) + '/' + _text(dates['day']) + '/' + _text(dates['year'])).where(dates['year'].notna(), '')
+    chunk['year'] = _text(year)
+
+    generic = generalize(chunk['indication_sp'])
+    chunk['indication_gen'] = pd.Series(generic, index=chunk.index).fillna(chunk['indication_gen'])
+    chunk, _ = ages.with_age_groups(chunk)
+    chunk['Age Group'] = chunk['Age Group'].astype(object).fillna('')
+
+    listed, joined, continents, codes = _populations(chunk['Study population'])
+    chunk['Study population'] = pd.Series(joined[codes], index=chunk.index).fillna(chunk['Study population'])
+    chunk['Continent'] = pd.Series(continents[codes], index=chunk.index).fillna(chunk['Continent'])
+
+    # each trial repeats the listed rows of its Study population
+    sizes = np.bincount(listed['value'].to_numpy(), minlength=len(joined))
+    starts = np.cumsum(sizes) - sizes
+    counts = sizes[codes]
+    trial = np.repeat(np.arange(len(chunk)), counts)
+    within = np.arange(len(trial)) - np.repeat(np.cumsum(counts) - counts, counts)
+    taken = listed.iloc[starts[codes][trial] + within]
+    rows = pd.DataFrame({
+        'trial': trial,
+        'Study population': taken['Study population'].to_numpy(),
+        'Continent': taken['Continent'].fillna(pd.Series(chunk['Continent'].to_numpy()[trial], index=taken.index)).to_numpy(),
+    })
+    return chunk, rows
+
+
+def _variant(name, trials, rows, first_trial):
+    spec = VARIANTS[name]
+    columns = [column for column in trials.columns if column not in spec['drop']]
+    frame = trials[columns]
+    if spec['per_country_rows']:
+        frame = frame.iloc[rows['trial'].to_numpy()].reset_index(drop=True)
+        frame['Study population'] = rows['Study population'].to_numpy()
+        frame['Continent'] = rows['Continent'].to_numpy()
+        frame.insert(0, spec['trial_number'], (rows['trial'].to_numpy() + first_trial).astype(str))
+    return frame.rename(columns=spec['rename'])
+
+
+def run(master, out, chunk_size=100_000):
+    # streams `master` once and writes every variant into `out`; returns
+    # {variant: rows written}
+    columns = master_columns()
+    header = list(pd.read_csv(master, nrows=0).columns)
+    missing = [column for column in REQUIRED if column not in header]
+    if missing:
+        raise ValueError(f'{master} has no columns {missing}')
+    os.makedirs(out, exist_ok=True)
+    targets = {name: os.path.join(out, datasets.DATASETS[name]['file']) for name in VARIANTS}
+    written = {name: 0 for name in VARIANTS}
+    writers = {}
+    trials = 0
+    try:
+        for chunk in pd.read_csv(master, dtype=str, keep_default_na=False, chunksize=chunk_size):
+            kept, rows = transform(chunk.reindex(columns=columns, fill_value=''))
+            for name in VARIANTS:
+                frame = _variant(name, kept, rows, trials)
+                # every column is text, so each chunk has the same schema
+                table = pa.Table.from_pandas(frame, schema=pa.schema([(column, pa.string()) for column in frame.columns]), preserve_index=False)
+                if name not in writers:
+                    writers[name] = pa_csv.CSVWriter(targets[name] + '.tmp', table.schema, write_options=pa_csv.WriteOptions(quoting_style='needed'))
+                writers[name].write_table(table)
+                written[name] += len(frame)
+            trials += len(kept)
+    except BaseException:
+        for name, writer in writers.items():
+            writer.close()
+            os.remove(targets[name] + '.tmp')
+        raise
+    for name, writer in writers.items():
+        writer.close()
+        os.replace(targets[name] + '.tmp', targets[name])
+    return written
+
+
+# derived columns compared per trial by check(), where a variant has them
+CHECKED = ['indication_gen', 'Age Group', 'year', 'year2']
+
+
+def check(out):
+    # Trials and rows of each written variant against the bundled export,
+    # then the derived columns of every trial in both (its first row in the
+    # one-row-per-country layout)
+    for name, spec in VARIANTS.items():
+        id_column = spec['rename'].get('ID', 'ID')
+        encoding = schema.SCHEMAS.get(name, {}).get('encoding')
+        bundled = pd.read_csv(datasets.path(name), dtype=str, keep_default_na=False, encoding=encoding)
+        derived = pd.read_csv(os.path.join(out, datasets.DATASETS[name]['file']), dtype=str, keep_default_na=False)
+        bundled[id_column] = bundled[id_column].str.strip()
+        bundled = bundled[bundled[id_column] != '']
+        only_derived = sorted(set(derived[id_column]) - set(bundled[id_column]))
+        only_bundled = sorted(set(bundled[id_column]) - set(derived[id_column]))
+        print(f'{name}: {len(derived)} rows ({len(bundled)} bundled), {derived[id_column].nunique()} trials ({bundled[id_column].nunique()} bundled)')
+        if only_bundled:
+            print(f'  excluded here: {", ".join(only_bundled)}')
+        if only_derived:
+            print(f'  not in the bundled export: {", ".join(only_derived)}')
+
+        if spec['per_country_rows']:
+            sizes = pd.concat([bundled.groupby(id_column).size(), derived.groupby(id_column).size()], axis=1, join='inner')
+            print(f'  country rows: {(sizes[0] != sizes[1]).sum()} of {len(sizes)} trials have a different number (blank or repeated countries are dropped)')
+
+        columns = [column for column in CHECKED if column in derived and column in bundled]
+        pairs = bundled.drop_duplicates(id_column).set_index(id_column)[columns].join(
+            derived.drop_duplicates(id_column).set_index(id_column)[columns], how='inner', rsuffix=' (derived)')
+        for column in columns:
+            before = pairs[column].str.strip()
+            after = pairs[f'{column} (derived)'].str.strip()
+            changed = pairs[before != after]
+            print(f'  {column}: {len(changed)} of {len(pairs)} trials differ')
+            for trial, row in changed.iterrows():
+                print(f'    {trial}: {row[column]!r} -> {row[f"{column} (derived)"]!r}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Derive every trial export variant from one master export.')
+    parser.add_argument('out', help='directory for the variants; use it as BMI706_DATA_DIR')
+    parser.add_argument('--master', help='CSV in the layout of the generalized export (default: that export)')
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--check', action='store_true', help='compare the variants with the bundled exports')
+    args = parser.parse_args(argv)
+    master = args.master or datasets.path(MASTER)
+    start = time.perf_counter()
+    try:
+        written = run(master, args.out, args.chunk_size)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+    for name, count in written.items():
+        print(f'{name}: {count} rows written to {os.path.join(args.out, datasets.DATASETS[name]["file"])}')
+    print(f'{elapsed:.2f} s')
+    if args.check:
+        check(args.out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
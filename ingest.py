@@ -0,0 +1,191 @@
+import argparse
+import datetime
+import glob
+import hashlib
+import os
+import sys
+import threading
+
+import pandas as pd
+
+import countries
+import datasets
+import schema
+
+# Append-only store for new trial records.
+#
+# Instead of hand-editing country.csv or deriving yet another CSV, new trials
+# arrive as batches in the layout of country.csv (one row per trial and
+# country) or of the OLE-excluded export (one row per trial). A batch is
+# validated against schema.py, the known phases (PHASES) and plausible
+# completion years, then written as a new numbered parquet file
+# under build/ingest/<dataset>; existing batches are never rewritten. The
+# aggregate tables (aggregates.py) and the year indexes (year_index.py) are
+# updated by the batch's counts alone.
+#
+#   python ingest.py country new_trials.csv
+#   python ingest.py minus_ole new_trials.csv
+
+STORE_DIR = os.path.join(datasets.BUILD_DIR, 'ingest')
+
+# columns a batch must fill for each dataset
+REQUIRED = {
+    'country': ['Gender', 'Study population', 'year', 'phase'],
+    'minus_ole': ['Gender', 'source', 'year', 'phase'],
+}
+NCT_ID = r'^NCT\d{8}(,\s*NCT\d{8})*$'
+# phases as the exports spell them
+PHASES = ['Phase 1', 'Phase 1/Phase 2', 'Phase 2', 'Phase 2/Phase 3', 'Phase 3', 'Phase 4', 'N/A']
+# completion years: none before this (1900 is the exports' unknown-year
+# placeholder), and planned completions at most this many years ahead
+FIRST_YEAR = 1980
+YEARS_AHEAD = 10
+
+_lock = threading.Lock()
+
+
+def _columns(name):
+    # the export's header, so batches cannot invent columns
+    encoding = schema.SCHEMAS.get(name, {}).get('encoding')
+    return list(pd.read_csv(datasets.path(name), nrows=0, encoding=encoding).columns)
+
+
+def validate(name, frame):
+    # Returns the batch typed as schema.py declares, or raises ValueError
+    # listing the offending rows.
+    if name not in REQUIRED:
+        raise ValueError(f'{name} does not accept new trials; use one of {list(REQUIRED)}')
+    known = _columns(name)
+    unknown = [column for column in frame.columns if column not in known]
+    missing = [column for column in REQUIRED[name] if column not in frame.columns]
+    if unknown or missing:
+        raise ValueError(f'batch for {name}: unknown columns {unknown}, missing columns {missing}')
+
+    frame = frame.reset_index(drop=True)
+    text = frame.astype(object).where(frame.notna(), None)
+    text = text.apply(lambda column: column.map(lambda value: None if value is None else (str(value).strip() or None)))
+    errors = []
+
+    for column in REQUIRED[name]:
+        for row in text.index[text[column].isna()]:
+            errors.append((row, f'{column} is empty'))
+
+    typed = pd.DataFrame(index=frame.index)
+    dtypes = schema.SCHEMAS.get(name, {}).get('dtype', {})
+    for column in frame.columns:
+        dtype = dtypes.get(column, object)
+        if dtype in (object, schema.CATEGORY):
+            typed[column] = text[column]
+            continue
+        numbers = pd.to_numeric(text[column], errors='coerce')
+        bad = text[column].notna() & (numbers.isna() | (numbers != numbers.round()))
+        for row in text.index[bad]:
+            errors.append((row, f'{column}={text[column][row]!r} is not an integer'))
+        typed[column] = numbers.where(~bad).astype(dtype)
+
+    ids = text['Gender'].dropna()
+    for row in ids.index[~ids.str.match(NCT_ID)]:
+        errors.append((row, f'Gender={ids[row]!r} is not an NCT id'))
+    last_year = datetime.date.today().year + YEARS_AHEAD
+    years = typed['year'].dropna()
+    for row in years.index[(years < FIRST_YEAR) | (years > last_year)]:
+        errors.append((row, f'year={years[row]} is not between {FIRST_YEAR} and {last_year}'))
+    phases = text['phase'].dropna()
+    for row in phases.index[~phases.isin(PHASES)]:
+        errors.append((row, f'phase={phases[row]!r} is not one of {PHASES}'))
+    if name == 'country':
+        names = text['Study population'].dropna()
+        for row in names.index[countries.positions(names) < 0]:
+            errors.append((row, f'Study population={names[row]!r} is not a known country (see country_aliases.csv)'))
+
+    if errors:
+        errors.sort()
+        listed = '\n'.join(f'  row {row}: {message}' for row, message in errors[:20])
+        more = f'\n  ... and {len(errors) - 20} more' if len(errors) > 20 else ''
+        raise ValueError(f'{len(errors)} problems in batch for {name}:\n{listed}{more}')
+    return typed
+
+
+def batches(name):
+    return sorted(glob.glob(os.path.join(STORE_DIR, name, '*.parquet')))
+
+
+def counts():
+    # dataset -> number of batches stored, recorded in the aggregates manifest
+    return {name: len(batches(name)) for name in REQUIRED if batches(name)}
+
+
+def _digest(frame):
+    return hashlib.sha1(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes()).hexdigest()
+
+
+def store(name, frame):
+    # validates and writes one batch; the same batch is only stored once
+    typed = validate(name, frame)
+    digest = _digest(typed.astype(str))
+    with _lock:
+        existing = batches(name)
+        if any(os.path.basename(batch).endswith(f'-{digest[:12]}.parquet') for batch in existing):
+            raise ValueError(f'this batch was already ingested into {name}')
+        target = os.path.join(STORE_DIR, name, f'{len(existing) + 1:06d}-{digest[:12]}.parquet')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        typed.to_parquet(target + '.tmp', index=False)
+        os.replace(target + '.tmp', target)
+    return target, typed
+
+
+def load(name, columns=None):
+    # every stored batch for `name`, oldest first, typed like datasets.load()
+    paths = batches(name)
+    if not paths:
+        return None
+    frame = pd.concat([pd.read_parquet(batch) for batch in paths], ignore_index=True)
+    if columns is not None:
+        # batches only carry the columns they were given
+        frame = frame.reindex(columns=list(columns))
+    dtypes = schema.SCHEMAS.get(name, {}).get('dtype', {})
+    return frame.astype({column: dtypes[column] for column in frame.columns if column in dtypes})
+
+
+def with_batches(name, frame, columns=None):
+    # an export frame followed by the ingested rows for that dataset
+    extra = load(name, columns) if name in REQUIRED else None
+    if extra is None:
+        return frame
+    merged = pd.concat([frame, extra], ignore_index=True)
+    dtypes = schema.SCHEMAS.get(name, {}).get('dtype', {})
+    return merged.astype({column: dtypes[column] for column in merged.columns if column in dtypes})
+
+
+def append(name, frame):
+    # store a batch and fold it into the aggregates and any loaded year index
+    import aggregates
+    import year_index
+
+    table_name = aggregates.DELTAS[name][0]
+    before = aggregates.version(table_name)
+    target, typed = store(name, frame)
+    delta = aggregates.apply_batch(name, typed)
+    if delta is not None:
+        year_index.apply_delta(table_name, delta, before)
+    return target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Append a batch of new trials and update the aggregate tables.')
+    parser.add_argument('dataset', choices=list(REQUIRED))
+    parser.add_argument('batch', help='CSV in the layout of the dataset')
+    args = parser.parse_args(argv)
+    encoding = schema.SCHEMAS.get(args.dataset, {}).get('encoding')
+    frame = pd.read_csv(args.batch, dtype=str, keep_default_na=False, encoding=encoding)
+    try:
+        target = append(args.dataset, frame)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    print(f'{len(frame)} rows appended to {target}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
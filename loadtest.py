@@ -0,0 +1,384 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.websocket import websocket_connect
+
+import datasets
+
+# Capacity test for one Streamlit server running task4.py.
+#
+# For every session count N a fresh `streamlit run task4.py` server is
+# started and warmed up by one session. Then N clients connect at once over
+# the same websocket protocol the browser uses, and each plays a scripted,
+# seeded sequence of interactions: moving the year slider, toggling a phase,
+# switching between the Country and Funding themes and picking a country.
+# Every interaction is one rerun, timed from sending the new widget state to
+# the server's script_finished message. The clients wait for each rerun
+# before the next one (plus --think), so N is the number of users clicking
+# at once.
+#
+# The report has p50/p95/p99 rerun latency, reruns per second over the whole
+# run and the server's resident memory (before the sessions and at its
+# peak). The same seed gives the same interactions, so reports from two
+# trees can be compared; with --check the run fails when p95 latency or
+# throughput is worse than the stored baseline.
+#
+#   python loadtest.py                       # 1, 4 and 16 sessions
+#   python loadtest.py --sessions 1 8 32 64 --reruns 20
+#   python loadtest.py --save-baseline
+#   python loadtest.py --check
+#
+# The clients share the machine with the server, so keep that in mind when
+# reading numbers from a small box.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+LOADTEST_DIR = os.path.join(datasets.BUILD_DIR, 'loadtest')
+BASELINE = os.path.join(LOADTEST_DIR, 'baseline.json')
+SCRIPT = 'task4.py'
+
+# widget labels in task4.py
+THEME = 'Select Theme'
+YEARS = 'Select Year'
+PHASES = 'Select Phase(s)'
+COUNTRY = 'Select Country'
+# interaction -> relative frequency
+ACTIONS = {'year': 4, 'phases': 3, 'theme': 1, 'country': 3}
+WIDGETS = ('selectbox', 'slider', 'multiselect', 'checkbox', 'text_input')
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def _memory_mb(pid, field):
+    # VmRSS (current) or VmHWM (peak) of a process, in MB; None off Linux
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class Server:
+
+    def __init__(self, script, env):
+        self.port = _free_port()
+        self.process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'streamlit', 'run', script,
+                '--server.headless', 'true', '--server.address', '127.0.0.1', '--server.port', str(self.port),
+                '--browser.gatherUsageStats', 'false', '--global.developmentMode', 'false',
+            ],
+            cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        self.url = f'ws://127.0.0.1:{self.port}/_stcore/stream'
+
+    def wait(self, timeout=120):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'streamlit exited:\n{self.process.stderr.read().decode()[-2000:]}')
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{self.port}/_stcore/health', timeout=1) as response:
+                    if response.read().strip() == b'ok':
+                        return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError(f'streamlit did not start within {timeout} s')
+
+    def rss_mb(self):
+        return _memory_mb(self.process.pid, 'VmRSS')
+
+    def peak_mb(self):
+        return _memory_mb(self.process.pid, 'VmHWM')
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class Session:
+    # one browser tab: its widgets as last rendered and the states it has set
+
+    def __init__(self, url, rng):
+        self.url = url
+        self.rng = rng
+        self.widgets = {}
+        self.states = {}
+        self.errors = []
+
+    async def connect(self):
+        self.connection = await websocket_connect(self.url, subprotocols=['streamlit'])
+
+    async def rerun(self):
+        # sends the widget states and waits for the script to finish;
+        # returns the rerun's latency in seconds
+        message = BackMsg()
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        started = time.perf_counter()
+        await self.connection.write_message(message.SerializeToString(), binary=True)
+        widgets = {}
+        while True:
+            payload = await self.connection.read_message()
+            if payload is None:
+                raise RuntimeError('the server closed the session')
+            forward = ForwardMsg()
+            forward.ParseFromString(payload)
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type in WIDGETS:
+                    widget = getattr(element, element_type)
+                    widgets[widget.label] = (element_type, widget)
+                elif element_type == 'exception':
+                    self.errors.append(f'{element.exception.type}: {element.exception.message}')
+            elif kind == 'script_finished':
+                if forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    break
+        elapsed = time.perf_counter() - started
+        self.widgets = widgets
+        # states of widgets that are gone (or changed identity) are dropped, as the browser does
+        live = {widget.id for _, widget in widgets.values()}
+        self.states = {key: state for key, state in self.states.items() if key in live}
+        return elapsed
+
+    def _current(self, label):
+        element_type, widget = self.widgets[label]
+        state = self.states.get(widget.id)
+        if element_type == 'slider':
+            return list(state.double_array_value.data) if state else list(widget.default)
+        if element_type == 'multiselect':
+            return list(state.int_array_value.data) if state else list(widget.default)
+        return state.int_value if state else widget.default
+
+    def _set(self, label, field, value):
+        _, widget = self.widgets[label]
+        state = WidgetState(id=widget.id)
+        if field == 'int_value':
+            state.int_value = value
+        else:
+            getattr(state, field).data.extend(value)
+        self.states[widget.id] = state
+
+    def interact(self):
+        # changes one widget, picked by ACTIONS among those on the page
+        available = {
+            'year': YEARS in self.widgets,
+            'phases': PHASES in self.widgets and len(self.widgets[PHASES][1].options) > 1,
+            'theme': THEME in self.widgets,
+            'country': COUNTRY in self.widgets and len(self.widgets[COUNTRY][1].options) > 1,
+        }
+        actions = [action for action, present in available.items() if present]
+        action = self.rng.choices(actions, [ACTIONS[action] for action in actions])[0]
+        if action == 'year':
+            slider = self.widgets[YEARS][1]
+            low, high = sorted(self.rng.randint(int(slider.min), int(slider.max)) for _ in range(2))
+            self._set(YEARS, 'double_array_value', [float(low), float(high)])
+        elif action == 'phases':
+            chosen = set(self._current(PHASES))
+            phase = self.rng.randrange(len(self.widgets[PHASES][1].options))
+            if phase in chosen and len(chosen) > 1:
+                chosen.remove(phase)
+            else:
+                chosen.add(phase)
+            self._set(PHASES, 'int_array_value', sorted(chosen))
+        elif action == 'theme':
+            self._set(THEME, 'int_value', 1 - self._current(THEME))
+        else:
+            self._set(COUNTRY, 'int_value', self.rng.randrange(len(self.widgets[COUNTRY][1].options)))
+        return action
+
+    def close(self):
+        self.connection.close()
+
+
+async def _play(session, reruns, think, latencies):
+    first = await session.rerun()
+    for _ in range(reruns):
+        if think:
+            await asyncio.sleep(session.rng.expovariate(1 / think))
+        action = session.interact()
+        latencies.append((action, await session.rerun()))
+    session.close()
+    return first
+
+
+async def _measure(server, sessions, reruns, seed, think):
+    # connects every client, then times them playing at once
+    clients = [Session(server.url, random.Random(seed * 100_003 + number)) for number in range(sessions)]
+    await asyncio.gather(*[client.connect() for client in clients])
+    latencies = []
+    samples = []
+
+    async def sample_memory():
+        while True:
+            samples.append(server.rss_mb())
+            await asyncio.sleep(0.1)
+
+    sampler = asyncio.ensure_future(sample_memory())
+    started = time.perf_counter()
+    firsts = await asyncio.gather(*[_play(client, reruns, think, latencies) for client in clients])
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+    errors = [error for client in clients for error in client.errors]
+    return firsts, latencies, elapsed, samples, errors
+
+
+def _percentiles(seconds):
+    if not len(seconds):
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    p50, p95, p99 = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99])
+    return {'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+
+
+def measure(sessions, reruns, seed=0, think=0.0, env=None):
+    # one fresh server, warmed up by a single session, then `sessions`
+    # clients at once
+    server = Server(SCRIPT, env or os.environ)
+    try:
+        server.wait()
+        asyncio.run(_measure(server, 1, 3, seed + 1, 0.0))
+        idle = server.rss_mb()
+        firsts, latencies, elapsed, samples, errors = asyncio.run(_measure(server, sessions, reruns, seed, think))
+        peak = server.peak_mb()
+    finally:
+        server.stop()
+    seconds = [latency for _, latency in latencies]
+    report = {
+        'sessions': sessions,
+        'reruns': len(seconds),
+        **_percentiles(seconds),
+        'first_run': _percentiles(firsts),
+        'by_action': {action: _percentiles([latency for name, latency in latencies if name == action]) for action in ACTIONS},
+        # first page loads included
+        'throughput': (len(seconds) + len(firsts)) / elapsed if elapsed else None,
+        'idle_mb': idle,
+        'rss_mb': max([sample for sample in samples if sample is not None], default=None),
+        'peak_mb': peak,
+        'errors': sorted(set(errors))[:5],
+    }
+    return report
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    import streamlit
+
+    return {
+        'script': SCRIPT,
+        'commit': commit,
+        'python': platform.python_version(),
+        'streamlit': streamlit.__version__,
+        'cpus': os.cpu_count(),
+        'data_dir': datasets.DATA_DIR,
+        'seed': args.seed,
+        'reruns': args.reruns,
+        'think_ms': args.think * 1000,
+    }
+
+
+def _ms(value):
+    return '      -' if value is None else f'{value:7.1f}'
+
+
+def _mb(value):
+    return '     -' if value is None else f'{value:6.1f}'
+
+
+def regressions(results, baseline, tolerance):
+    # Session counts whose p95 latency or throughput is worse than the
+    # baseline by more than `tolerance` (a fraction). A metric the baseline
+    # has no value for is skipped; one the run has no value for (no rerun
+    # finished) counts as a regression.
+    failed = []
+    checks = [
+        ('p95', 'p95_ms', ' ms', lambda after, before: after > before * (1 + tolerance)),
+        ('throughput', 'throughput', '/s', lambda after, before: after < before / (1 + tolerance)),
+    ]
+    for sessions, result in results.items():
+        previous = baseline.get(str(sessions))
+        if previous is None:
+            continue
+        for metric, key, unit, worse in checks:
+            before, after = previous.get(key), result.get(key)
+            if before is None:
+                continue
+            if after is None:
+                failed.append((sessions, metric, f'{before:.1f}{unit}', 'no value'))
+            elif worse(after, before):
+                failed.append((sessions, metric, f'{before:.1f}{unit}', f'{after:.1f}{unit}'))
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f'Run concurrent scripted sessions against {SCRIPT} and report rerun latency, throughput and memory.')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--reruns', type=int, default=10, help='interactions per session')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--think', type=float, default=0.0, help='mean pause between interactions, in seconds')
+    parser.add_argument('--json', help='also write the report to this file')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed slowdown as a fraction of the baseline')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, BMI706_OFFLINE=os.environ.get('BMI706_OFFLINE', '1'), MPLBACKEND='Agg', PYTHONPATH=REPO_DIR)
+    print(f"{'sessions':>8} {'reruns':>7} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'first ms':>8} {'runs/s':>7} {'idle MB':>7} {'peak MB':>7}", flush=True)
+    results = {}
+    for sessions in args.sessions:
+        report = measure(sessions, args.reruns, args.seed, args.think, env)
+        results[sessions] = report
+        print(f"{sessions:>8} {report['reruns']:>7} {_ms(report['p50_ms'])} {_ms(report['p95_ms'])} {_ms(report['p99_ms'])} "
+              f"{_ms(report['first_run']['p50_ms'])} {_ms(report['throughput'])} {_mb(report['idle_mb'])}  {_mb(report['peak_mb'])}", flush=True)
+        for error in report['errors']:
+            print(f'         error: {error}', flush=True)
+
+    document = {'environment': environment(args), 'results': results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(document, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f'baseline written to {args.baseline}')
+    failed = any(report['errors'] for report in results.values())
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressed = regressions(results, baseline['results'], args.tolerance)
+        for sessions, metric, before, after in regressed:
+            print(f'REGRESSION {sessions} sessions {metric}: {before} -> {after}')
+        failed = failed or bool(regressed)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
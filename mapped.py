@@ -0,0 +1,68 @@
+import os
+import threading
+
+import pyarrow as pa
+
+# Memory-mapped Arrow IPC (Feather v2) files.
+#
+# Tables are written uncompressed so a reader can map the file and use its
+# buffers in place: read() costs no parsing and no private copy, and every
+# process that maps the same file (several Streamlit workers behind a load
+# balancer) shares one copy in the OS page cache. Files are only ever
+# replaced, never rewritten in place, so a process still holding the old
+# mapping keeps reading a consistent table.
+#
+# The views filter a mapped table through a bitmap index over its columns
+# (bitmaps.IndexedTable) and take only the matching rows, so only those are
+# turned into a pandas frame; rows() converts a whole table.
+
+_lock = threading.Lock()
+# path -> (mtime_ns, size, Table)
+_tables = {}
+
+
+def from_frame(frame, schema=None):
+    # Categoricals become dictionary columns and nullable integers keep
+    # their pandas dtype through the schema metadata. Pass the schema of the
+    # table a frame was cut from so that even an empty frame keeps its types.
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+def write(frame, path):
+    table = frame if isinstance(frame, pa.Table) else from_frame(frame)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+    return table
+
+
+def read(path, columns=None):
+    # the table in `path`, mapped once per process and version of the file
+    stat = os.stat(path)
+    with _lock:
+        cached = _tables.get(path)
+    if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        cached = (stat.st_mtime_ns, stat.st_size, table)
+        with _lock:
+            _tables[path] = cached
+    table = cached[2]
+    return table if columns is None else table.select(list(columns))
+
+
+def forget(path):
+    # drop the cached mapping of a file that was superseded (the table stays
+    # valid for callers still holding it)
+    with _lock:
+        _tables.pop(path, None)
+
+
+def rows(table, columns=None):
+    # pandas frame of the table, or of the given columns only; numeric
+    # columns without nulls stay read-only views of the mapped buffers
+    if columns is not None:
+        table = table.select(list(columns))
+    return table.to_pandas(split_blocks=True)
@@ -0,0 +1,5 @@
+import os
+import runpy
+
+# Runs task3.py as a page of app.py
+runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'task3.py'), run_name='__main__')
@@ -0,0 +1,99 @@
+import pandas as pd
+
+# Declared column types for every dataset the dashboards read.
+#
+# Low-cardinality text columns are categoricals, years and counts are nullable
+# integers sized to their range, and free text (titles, ids, notes) stays as
+# plain strings. datasets.load() applies these when parsing, so no script needs
+# its own astype()/encoding fixes. Columns that are not listed here are read
+# with pandas' defaults.
+#
+# `python schema.py` prints the memory footprint of each dataset with and
+# without the schema.
+
+CATEGORY = 'category'
+
+# columns shared by the trial exports (country.csv and the OLE variants)
+_TRIAL_COLUMNS = {
+    'Male': 'Int32',
+    'Female': 'Int32',
+    'Total': 'Int32',
+    'year': 'Int16',
+    'year2': 'Int8',
+    'phase': CATEGORY,
+    'Published paper': 'Int8',
+    'Published paper  YN': CATEGORY,
+    'Published result in clicnicaltrials': CATEGORY,
+    'others': CATEGORY,
+    'R/O': CATEGORY,
+    'source': CATEGORY,
+    'Age eligible for study': CATEGORY,
+    'Lowe limit of age < 18': CATEGORY,
+    'Age upper limit': CATEGORY,
+    'Age code upper limit': CATEGORY,
+    'Study population': CATEGORY,
+    'Continent': CATEGORY,
+    'Is there an extension study': CATEGORY,
+}
+
+SCHEMAS = {
+    'clinical_trials_sample': {
+        'dtype': {'Country': CATEGORY, 'Year': 'int16', 'Phase': CATEGORY, 'Trials': 'int32'},
+    },
+    'country': {
+        'dtype': {**_TRIAL_COLUMNS, 'Unnamed: 0': 'Int32', 'source.1': 'Int8', 'Country': 'Int8'},
+    },
+    'minus_ole': {
+        'dtype': {**_TRIAL_COLUMNS, 'source2': 'Int8', 'Country': CATEGORY},
+    },
+    'minus_ole_generalized': {
+        'dtype': {
+            **_TRIAL_COLUMNS,
+            'source2': 'Int8',
+            'Country': CATEGORY,
+            'indication_sp': CATEGORY,
+            'indication_gen': CATEGORY,
+            'Age Group': CATEGORY,
+        },
+    },
+    'pharma_country': {
+        'encoding': 'latin1',
+        'dtype': {'source': CATEGORY, 'Study population': CATEGORY},
+    },
+    'country_aliases': {
+        'dtype': {'country-code': 'int16', 'Continent': CATEGORY, 'Latitude': 'float32', 'Longitude': 'float32'},
+    },
+}
+
+
+def read_csv_kwargs(name, columns=None):
+    # keyword arguments for pd.read_csv, restricted to `columns` when given
+    spec = SCHEMAS.get(name, {})
+    kwargs = {key: value for key, value in spec.items() if key != 'dtype'}
+    dtype = spec.get('dtype', {})
+    if columns is not None:
+        kwargs['usecols'] = list(columns)
+        dtype = {column: value for column, value in dtype.items() if column in columns}
+    kwargs['dtype'] = dtype
+    return kwargs
+
+
+def memory_report():
+    import datasets
+
+    rows = []
+    for name in SCHEMAS:
+        try:
+            file_path = datasets.path(name)
+        except (OSError, ValueError) as error:
+            print(f'skipping {name}: {error}')
+            continue
+        plain_kwargs = {key: value for key, value in SCHEMAS[name].items() if key != 'dtype'}
+        before = pd.read_csv(file_path, **plain_kwargs).memory_usage(deep=True).sum()
+        after = pd.read_csv(file_path, **read_csv_kwargs(name)).memory_usage(deep=True).sum()
+        rows.append({'dataset': name, 'before_kb': before / 1024, 'after_kb': after / 1024, 'ratio': before / after})
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    print(memory_report().to_string(index=False, float_format='{:.1f}'.format))
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import aggregates
+import datasets
+import ingest
+import mapped
+
+# Full-text search over the trials.
+#
+# Every trial (every id in the country export and the OLE-excluded export,
+# trials appended through ingest.py included) is a document made of its
+# official_title, intervention_names and source, plus indication_sp where the
+# trial is in the generalized export. build() tokenizes them all at once with
+# pandas string methods into an inverted index: a sorted vocabulary and, per
+# term, the sorted positions of the trials that contain it. The index is
+# compiled into build/search once per version of the sources, as Arrow files
+# every server process maps (see mapped.py).
+#
+# Normalization strips accents and case, joins drug codes ("SPM 927",
+# "BIA 2-093" -> spm927, bia2093), drops salt, formulation and filler words,
+# and indexes the brand names and codes in drug_aliases.csv as synonyms of
+# the generic name, so "keppra" also finds trials that only say
+# levetiracetam. Every query word matches as a prefix and a trial matches
+# when it has all of them. Terms sharing a prefix are adjacent in the sorted
+# vocabulary, so a prefix's trials are one contiguous slice of the postings.
+#
+#   python search.py keppra placebo
+
+SEARCH_DIR = os.path.join(datasets.BUILD_DIR, 'search')
+
+# dataset -> (trial id column, searchable columns)
+SOURCES = {
+    'country': ('Gender', ['official_title', 'intervention_names', 'source']),
+    'minus_ole': ('Gender', ['official_title', 'intervention_names', 'source']),
+    'minus_ole_generalized': ('ID', ['indication_sp']),
+}
+# datasets whose rows the aggregate tables count (see aggregates.COLUMNS)
+COUNTED = ['country', 'minus_ole']
+
+# "SPM 927", "rwj-17021-000": a short prefix and digit groups
+CODE = r'(?i)\b([a-z]{2,5})[ -]?(\d+(?:-\d+)*)\b'
+WORD = r'[a-z0-9]+'
+# mis-decoded symbols glued to a word ("KeppraÔÎ" for "Keppra™"): an upper
+# case accented letter straight after a lower case one starts a new word
+MOJIBAKE = r'(?<=[a-z])(?=[À-Þ])'
+STOPWORDS = {
+    'a', 'an', 'and', 'as', 'at', 'by', 'for', 'from', 'in', 'into', 'of', 'on', 'or', 'the', 'to', 'vs', 'with',
+    # salts and formulations, so "valproate sodium" and "topiramate tablets" match the drug
+    'acetate', 'hcl', 'hydrochloride', 'sodium', 'tablet', 'tablets', 'capsule', 'capsules', 'mg',
+}
+
+_lock = threading.Lock()
+_index = None
+
+
+def _join_code(match):
+    return match.group(1) + match.group(2).replace('-', '')
+
+
+def _join_code_keeping_parts(match):
+    return f'{match.group(0)} {_join_code(match)}'
+
+
+def words(texts, keep_parts=True):
+    # Normalized words of every text, one row per word, indexed like
+    # `texts`. Documents keep the parts of a joined code as words too, so
+    # "Phase 3" matches "phase" and "3" as well as "phase 3"; queries only
+    # use the joined code.
+    text = pd.Series(texts, dtype=object).fillna('').astype(str)
+    text = text.str.replace(CODE, _join_code_keeping_parts if keep_parts else _join_code, regex=True)
+    text = text.str.replace(MOJIBAKE, ' ', regex=True)
+    text = text.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii').str.casefold()
+    found = text.str.findall(WORD).explode().dropna()
+    return found[~found.isin(STOPWORDS)]
+
+
+def _aliases():
+    # alias -> generic drug name
+    table = datasets.load('drug_aliases')
+    aliases = table.set_index('Drug')['aliases'].fillna('').str.split(';').explode()
+    aliases = aliases[aliases.str.strip() != '']
+    found = words(aliases.to_numpy(), keep_parts=False)
+    return pd.DataFrame({'drug': aliases.index.str.casefold()[found.index], 'alias': found.to_numpy()})
+
+
+def _frames():
+    # dataset -> its trial id and searchable columns, ingested batches included
+    frames = {}
+    for name, (id_column, fields) in SOURCES.items():
+        columns = [id_column] + fields
+        frames[name] = ingest.with_batches(name, datasets.load(name, columns), columns)
+    return frames
+
+
+def _ids(values):
+    return pd.Series(values, dtype=object).str.strip()
+
+
+def _version():
+    # the sources and the ingested batches the index was built from
+    sources = {name: datasets.digest(name) for name in list(SOURCES) + ['drug_aliases']}
+    sources['ingested'] = ingest.counts()
+    return hashlib.sha1(json.dumps(sources, sort_keys=True).encode()).hexdigest()
+
+
+def build():
+    frames = _frames()
+    ids = pd.concat([_ids(frames[name][SOURCES[name][0]]) for name in COUNTED], ignore_index=True)
+    trials = pd.Index(pd.unique(ids.dropna()))
+    # dataset -> position in `trials` of every row's trial (-1 without an id)
+    positions = {name: trials.get_indexer(_ids(frame[SOURCES[name][0]])) for name, frame in frames.items()}
+
+    texts = np.concatenate([frames[name][field].astype(object).to_numpy() for name in frames for field in SOURCES[name][1]])
+    owners = np.concatenate([positions[name] for name in frames for field in SOURCES[name][1]])
+    found = words(texts)
+    pairs = pd.DataFrame({'trial': owners[found.index.to_numpy()], 'term': found.to_numpy()})
+    pairs = pairs[pairs['trial'] >= 0]
+
+    # brand names and codes count as their generic drug, and the generic
+    # drug's trials are indexed under every alias too
+    aliases = _aliases()
+    generic = pd.Series(aliases['drug'].to_numpy(), index=aliases['alias'].to_numpy())
+    pairs['term'] = pairs['term'].map(generic).fillna(pairs['term'])
+    synonyms = pairs.merge(aliases, left_on='term', right_on='drug')[['trial', 'alias']]
+    pairs = pd.concat([pairs, synonyms.rename(columns={'alias': 'term'})], ignore_index=True).drop_duplicates()
+
+    vocabulary = np.unique(pairs['term'].to_numpy())
+    codes = np.searchsorted(vocabulary, pairs['term'].to_numpy())
+    sizes = np.bincount(codes, minlength=len(vocabulary))
+    order = np.lexsort((pairs['trial'].to_numpy(), codes))
+    terms = pd.DataFrame({'term': vocabulary, 'start': np.cumsum(sizes) - sizes, 'stop': np.cumsum(sizes)})
+    postings = pd.DataFrame({'trial': pairs['trial'].to_numpy()[order].astype(np.int32)})
+
+    os.makedirs(SEARCH_DIR, exist_ok=True)
+    mapped.write(terms, os.path.join(SEARCH_DIR, 'terms.arrow'))
+    mapped.write(postings, os.path.join(SEARCH_DIR, 'postings.arrow'))
+    mapped.write(pd.DataFrame({'id': trials.to_numpy(dtype=object)}), os.path.join(SEARCH_DIR, 'trials.arrow'))
+    for name in COUNTED:
+        mapped.write(pd.DataFrame({'trial': positions[name].astype(np.int32)}), os.path.join(SEARCH_DIR, f'rows_{name}.arrow'))
+    with open(os.path.join(SEARCH_DIR, 'source.sha1'), 'w') as f:
+        f.write(_version())
+
+
+class SearchIndex:
+
+    def __init__(self, version):
+        self.version = version
+        terms = mapped.read(os.path.join(SEARCH_DIR, 'terms.arrow'))
+        self.terms = terms.column('term').to_numpy(zero_copy_only=False)
+        self.starts = terms.column('start').to_numpy()
+        self.stops = terms.column('stop').to_numpy()
+        self.postings = mapped.read(os.path.join(SEARCH_DIR, 'postings.arrow')).column('trial').to_numpy()
+        self.trials = pd.Index(mapped.read(os.path.join(SEARCH_DIR, 'trials.arrow')).column('id').to_numpy(zero_copy_only=False))
+        self._rows = {name: mapped.read(os.path.join(SEARCH_DIR, f'rows_{name}.arrow')).column('trial').to_numpy() for name in COUNTED}
+        self._frames = {}
+
+    def prefix(self, word):
+        # sorted positions of the trials with a term starting with `word`
+        low = np.searchsorted(self.terms, word, 'left')
+        # '\x7f' sorts after every letter and digit
+        high = np.searchsorted(self.terms, word + '\x7f', 'left')
+        if low == high:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(self.postings[self.starts[low]:self.stops[high - 1]])
+
+    def lookup(self, query):
+        # Sorted positions of the trials matching every word of `query`, or
+        # None when the query has no searchable words (no filter).
+        query_words = pd.unique(words([query], keep_parts=False).to_numpy())
+        if not len(query_words):
+            return None
+        matches = None
+        for word in sorted(query_words, key=len, reverse=True):
+            found = self.prefix(word)
+            matches = found if matches is None else np.intersect1d(matches, found, assume_unique=True)
+            if not len(matches):
+                break
+        return matches
+
+    def rows(self, name, matches):
+        # positions of the rows of dataset `name` (as aggregates.py reads it)
+        # that belong to the matching trials
+        hit = np.zeros(len(self.trials) + 1, dtype=bool)
+        hit[matches] = True
+        # rows without a trial (-1) look up the trailing False
+        return np.flatnonzero(hit[self._rows[name]])
+
+    def frame(self, name):
+        # the columns aggregates.py counts for dataset `name`, row for row
+        # with rows(); datasets.load's shared frame unless batches were
+        # ingested, merged once per index otherwise
+        if name not in self._frames:
+            columns = aggregates.COLUMNS[name]
+            self._frames[name] = ingest.with_batches(name, datasets.load(name, columns), columns)
+        return self._frames[name]
+
+
+def get():
+    global _index
+    current = _version()
+    with _lock:
+        if _index is not None and _index.version == current:
+            return _index
+        try:
+            with open(os.path.join(SEARCH_DIR, 'source.sha1')) as f:
+                built = f.read().strip()
+        except OSError:
+            built = None
+        if built != current:
+            build()
+        _index = SearchIndex(current)
+        return _index
+
+
+if __name__ == '__main__':
+    index = get()
+    print(f'{len(index.trials)} trials, {len(index.terms)} terms, {len(index.postings)} postings in {SEARCH_DIR}')
+    query = ' '.join(sys.argv[1:])
+    if query:
+        start = time.perf_counter()
+        matches = index.lookup(query)
+        elapsed = time.perf_counter() - start
+        if matches is None:
+            print(f'{query!r} has no searchable words')
+        else:
+            found = list(index.trials[matches])
+            print(f'{len(found)} trials match {query!r} ({elapsed * 1000:.2f} ms): {", ".join(found[:20])}')
@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Concurrent-session check for the multipage app (app.py).
+#
+# For every session count, a fresh interpreter first has that many threads
+# ask for the shared store (see store.py) at once while it is still cold, as
+# the first sessions after a restart do, and checks they all get the same
+# one. It then opens that many Streamlit sessions (streamlit.testing AppTest,
+# cycling through the pages) and keeps them all alive while each changes its
+# filters a few times in turn, and reports the peak resident memory. With
+# the store shared, memory should stay roughly flat as sessions are added.
+# AppTest runs one script at a time per process (it sets up a process-wide
+# runtime for each run), so the sessions' reruns are interleaved rather than
+# simultaneous. loadtest.py measures truly concurrent sessions against a
+# running server.
+#
+#   python sessions.py                       # 1, 4 and 16 sessions
+#   python sessions.py --sessions 1 8 32
+#   BMI706_DATA_DIR=/path/to/bigger/exports python sessions.py
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGES = ['pages/1_Sample_trials.py', 'pages/2_Country_trials.py', 'pages/3_Trials_and_funding.py', 'pages/4_Seizure_types.py']
+
+RUNNER = '''
+import json, logging, resource, sys, threading
+from streamlit.testing.v1 import AppTest
+import store
+logging.disable(logging.WARNING)
+pages, sessions, reruns = json.loads(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def interact(app, step):
+    # change one filter per rerun, in turn
+    widgets = list(app.selectbox) + list(app.multiselect) + list(app.checkbox)
+    if not widgets:
+        return
+    widget = widgets[step % len(widgets)]
+    if widget.type == 'selectbox' and len(widget.options) > 1:
+        widget.select(widget.options[step % len(widget.options)])
+    elif widget.type == 'multiselect' and len(widget.value) > 1:
+        widget.unselect(widget.value[0])
+    elif widget.type == 'checkbox':
+        widget.set_value(not widget.value)
+
+# cold store, every session asking at once
+stores = []
+threads = [threading.Thread(target=lambda: stores.append(id(store.get()))) for _ in range(sessions)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+
+# warm up: every page once, so the figure caches are filled
+for page in pages:
+    AppTest.from_file(page, default_timeout=120).run()
+warm = rss_mb()
+
+apps = [AppTest.from_file(pages[number % len(pages)], default_timeout=120) for number in range(sessions)]
+errors = []
+for step in range(reruns + 1):
+    for app in apps:
+        if step:
+            interact(app, step - 1)
+        app.run()
+        stores.append(id(store.get()))
+        errors.extend(str(e.value) for e in app.exception)
+print('SESSIONS ' + json.dumps({'warm_mb': warm, 'peak_mb': rss_mb(), 'stores': len(set(stores)), 'errors': errors[:5]}))
+'''
+
+
+def measure(sessions, reruns, env):
+    result = subprocess.run(
+        [sys.executable, '-c', RUNNER, json.dumps(PAGES), str(sessions), str(reruns)],
+        cwd=REPO_DIR, env=env, capture_output=True, text=True,
+    )
+    lines = [line for line in result.stdout.splitlines() if line.startswith('SESSIONS ')]
+    if result.returncode or not lines:
+        raise RuntimeError(f'{sessions} sessions failed:\n{result.stderr[-2000:]}')
+    return json.loads(lines[-1][len('SESSIONS '):])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run concurrent sessions of the multipage app and report peak memory.')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--reruns', type=int, default=3, help='filter changes per session')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, BMI706_OFFLINE=os.environ.get('BMI706_OFFLINE', '1'), MPLBACKEND='Agg', PYTHONPATH=REPO_DIR)
+    results = {}
+    failed = False
+    for sessions in args.sessions:
+        report = measure(sessions, args.reruns, env)
+        results[sessions] = report
+        failed = failed or bool(report['errors']) or report['stores'] != 1
+        print(f"{sessions:>4} sessions  warm {report['warm_mb']:7.1f} MB  peak {report['peak_mb']:7.1f} MB  "
+              f"(+{report['peak_mb'] - report['warm_mb']:.1f})  stores seen {report['stores']}", flush=True)
+        for error in report['errors']:
+            print(f'     error: {error}', flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import aliases
+import datasets
+
+# Canonical sponsors for the funding views.
+#
+# The exports spell the same sponsor several ways ("UCB Pharma", "UCB Pharma\n",
+# "Boston Children_ã_s Hospital", ...). sponsor_aliases.csv lists every known
+# sponsor with its parent company or institution and the spellings seen in
+# the data. It is compiled once into build/sponsors: a table of sponsors
+# (sponsor-id is the row number) and an index from normalized spelling to
+# sponsor-id. Normalization handles what aliases should not have to: case,
+# punctuation, whitespace, "&"/"and", legal suffixes (Inc., LLC, Ltd, S.A.)
+# and collaborators listed on further lines after the lead sponsor.
+#
+# Aggregations group on the int32 sponsor-id (or parent-id) and attach names
+# afterwards. Sponsors missing from the dictionary are not dropped: encode()
+# gives them ids after the known ones and returns them in the lookup table.
+
+SPONSORS_DIR = os.path.join(datasets.BUILD_DIR, 'sponsors')
+
+LEGAL_SUFFIX = r'(\s+(inc|llc|l l c|ltd|limited|co|corp|corporation|s a|sa|a s|pte|gmbh|plc|ag))+$'
+
+
+def normalize(names):
+    names = pd.Series(names, dtype=object).fillna('')
+    lead = names.str.strip().str.split('\n').str[0]
+    folded = lead.str.casefold().str.replace('&', ' and ', regex=False)
+    words = folded.str.replace(r'[\W_]+', ' ', regex=True).str.strip()
+    return words.str.replace(LEGAL_SUFFIX, '', regex=True).str.strip()
+
+
+def _compile(source):
+    table = pd.DataFrame({
+        'sponsor-id': np.arange(len(source), dtype=np.int32),
+        'source': source['Sponsor'].astype(object),
+        'parent': source['Parent'].fillna(source['Sponsor']).astype(object),
+    })
+    return table, table['source']
+
+
+# compiled into build/sponsors (see aliases.py)
+_table = aliases.AliasTable('sponsor_aliases', SPONSORS_DIR, 'sponsor', normalize, _compile, 'sponsor-id')
+
+
+def build():
+    return _table.build()
+
+
+def _load():
+    return _table.load()
+
+
+def sponsors():
+    # sponsor-id, source (canonical name), parent
+    return _load()[0].copy()
+
+
+def _display_name(names):
+    # the lead sponsor line with surrounding whitespace removed
+    return pd.Series(names, dtype=object).str.strip().str.split('\n').str[0].str.strip()
+
+
+def encode(names, lookup=None):
+    # Sponsor ids for `names` (-1 for missing values) and the lookup table
+    # they refer to. Names not in the dictionary, and not yet in `lookup`
+    # when one is passed, are added to it under new ids, each distinct
+    # normalized spelling once.
+    table, alias_index = _load()
+    lookup = table if lookup is None else lookup
+    values = aliases.factorize(names)
+    keys = normalize(values.categories).to_numpy()
+    resolved = alias_index.reindex(keys).fillna(-1).to_numpy(dtype=np.int32)
+
+    missing = resolved < 0
+    if missing.any():
+        # unknown sponsors are their own parent, named by their first spelling
+        known = pd.Series(lookup['sponsor-id'].to_numpy(), index=normalize(lookup['source']).to_numpy())
+        known = known[~known.index.duplicated()]
+        resolved[missing] = known.reindex(keys[missing]).fillna(-1).to_numpy(dtype=np.int32)
+        new_keys = pd.unique(keys[resolved < 0])
+        if len(new_keys):
+            first_spelling = pd.Series(values.categories, index=keys).groupby(level=0).first()
+            names_new = _display_name(first_spelling.reindex(new_keys))
+            start = int(lookup['sponsor-id'].max()) + 1 if len(lookup) else 0
+            added = pd.DataFrame({
+                'sponsor-id': np.arange(start, start + len(new_keys), dtype=np.int32),
+                'source': names_new.to_numpy(),
+                'parent': names_new.to_numpy(),
+            })
+            lookup = pd.concat([lookup, added], ignore_index=True)
+            new_ids = pd.Series(added['sponsor-id'].to_numpy(), index=new_keys)
+            still = resolved < 0
+            resolved[still] = new_ids.reindex(keys[still]).to_numpy(dtype=np.int32)
+
+    resolved = np.append(resolved, -1)
+    # code -1 (missing value) picks the trailing -1
+    return resolved[values.codes].astype(np.int32), lookup
+
+
+def parent_ids(lookup):
+    # parent-id for every row of a lookup table, numbered in order of appearance
+    return pd.Series(pd.factorize(lookup['parent'])[0].astype(np.int32), index=lookup.index)
+
+
+def unmatched(names):
+    _, alias_index = _load()
+    names = pd.Series(names, dtype=object).dropna()
+    keys = normalize(names)
+    return sorted(names[~keys.isin(alias_index.index)].unique())
+
+
+if __name__ == '__main__':
+    table, spellings = build()
+    print(f'{len(table)} sponsors, {table["parent"].nunique()} parents, {len(spellings)} spellings written to {SPONSORS_DIR}')
+    for name in sys.argv[1:] or ['country', 'minus_ole', 'minus_ole_generalized', 'pharma_country']:
+        names = datasets.load(name, ['source'])['source']
+        missing = unmatched(names)
+        print(f"{name}: {len(missing)} unmatched: {', '.join(repr(n) for n in missing)}")
@@ -0,0 +1,435 @@
+import numpy as np
+import pandas as pd
+
+import aggregates
+import bitmaps
+import charts
+import countries
+import mapped
+import sponsors
+import year_index
+
+# The load -> filter -> aggregate -> chart steps of every dashboard as plain
+# functions of their inputs. The Streamlit scripts call these, and bench.py
+# times the same functions headless against the bundled and synthetic data.
+#
+# The plotting libraries (altair, pydeck, matplotlib, plotly) are imported by
+# the chart functions that use them, so a page only pays for its own views.
+
+
+# ---- task1.py: sample trials per country, year and phase
+
+def sample_bitmaps(df):
+    # phase and country bitmaps and the year order of the sample trials (see bitmaps.py)
+    return bitmaps.BitmapIndex({'Phase': df['Phase'], 'Country': df['Country']}, df['Year'], 'Year')
+
+
+def filter_sample(df, index, phases, years=None):
+    # rows of `df` (indexed by `index`) in the selected phases and years
+    mask = index.where(isin={'Phase': phases}, between={'Year': years} if years is not None else None)
+    return df.iloc[index.rows(mask)]
+
+
+def ranking_frame(ranking, name, count):
+    # The country ranking list as one table: country and trials, largest
+    # first. st.dataframe sends it as a single Arrow payload and scrolls it
+    # virtually, instead of one element per country.
+    frame = pd.DataFrame({'Country': ranking[name].astype(object).to_numpy(), 'Trials': ranking[count].to_numpy().astype(np.int64)})
+    return frame.sort_values('Trials', ascending=False, kind='stable', ignore_index=True)
+
+
+def sample_ranking(df):
+    return df.groupby('Country', observed=True)['Trials'].sum().reset_index().sort_values('Trials', ascending=False)
+
+
+def sample_heatmap_data(df):
+    return df.groupby(['Country', 'Year'], observed=True)['Trials'].sum().reset_index()
+
+
+# radius in metres of the country with the most trials on the sample map
+MAP_MAX_RADIUS = 800000
+
+
+def sample_map_points(ranking):
+    # One point per country of sample_ranking(): [longitude, latitude] from
+    # country_aliases.csv, looked up once per country, the trial count and a
+    # radius scaled to the largest count (by area, so sqrt). The map then
+    # carries one small record per country, whatever the number of trial
+    # rows behind it.
+    coords = countries.lookup(ranking['Country'], ['Latitude', 'Longitude'])
+    known = coords['Latitude'].notna().to_numpy()
+    position = np.column_stack([coords['Longitude'].to_numpy(dtype=float), coords['Latitude'].to_numpy(dtype=float)])[known]
+    trials = ranking['Trials'].to_numpy(dtype=np.int64)[known]
+    largest = trials.max() if len(trials) and trials.max() > 0 else 1
+    return pd.DataFrame({
+        'position': np.round(position, 2).tolist(),
+        'trials': trials,
+        'radius': np.round(np.sqrt(trials / largest) * MAP_MAX_RADIUS),
+    })
+
+
+def sample_map(points):
+    import pydeck as pdk
+
+    view_state = pdk.ViewState(latitude=0, longitude=0, zoom=1)
+    layer = pdk.Layer(
+        'ScatterplotLayer',
+        points,
+        get_position='position',
+        get_color='[200, 30, 0, 160]',
+        get_radius='radius',
+        radius_min_pixels=2,
+        radius_max_pixels=40,
+    )
+    return pdk.Deck(layers=[layer], initial_view_state=view_state, map_style='mapbox://styles/mapbox/light-v9')
+
+
+def sample_heatmap(heatmap_data):
+    import altair as alt
+
+    return alt.Chart(heatmap_data).mark_rect().encode(
+        x='Year:O',
+        y='Country:N',
+        color='Trials:Q',
+        tooltip=['Country', 'Year', 'Trials']
+    ).properties(
+        width=300,
+        height=300
+    )
+
+
+def sample_country_line(df_country):
+    import altair as alt
+
+    return alt.Chart(df_country).mark_line(point=True).encode(
+        x='Year',
+        y='Trials',
+        color='Phase',
+        tooltip=['Year', 'Phase', 'Trials']
+    ).properties(
+        width=500,
+        height=300
+    ).interactive()
+
+
+# ---- task2.py: mock trials per pharmaceutical company
+#
+# task2.py reads no data file: it shows a random sample, drawn with the same
+# seed and in the same order as the script always did. bench.py scales it
+# through `size`.
+
+COMPANY_YEARS = range(2010, 2021)
+
+
+def company_sample(size=100, seed=42):
+    rng = np.random.RandomState(seed)
+    years = rng.choice(COMPANY_YEARS, size=size)
+    companies = rng.choice(['Pharma A', 'Pharma B', 'Pharma C', 'Pharma D', 'Pharma E'], size=size)
+    phases = rng.choice(['Phase 1', 'Phase 2', 'Phase 3', 'Phase 4'], size=size)
+    return pd.DataFrame({'Year': years, 'Company': companies, 'Phase': phases})
+
+
+def company_summary(df):
+    return df.groupby(['Year', 'Company']).size().reset_index(name='Trials')
+
+
+def company_year_trials(df, year):
+    df_filtered = df[df['Year'] == year]
+    return df_filtered.groupby('Company').size().reset_index(name='Trials')
+
+
+def company_line(company_summary):
+    import altair as alt
+
+    return alt.Chart(company_summary).mark_line(point=True).encode(
+        x=alt.X('Year:O', scale=alt.Scale(domain=list(COMPANY_YEARS))),
+        y='Trials:Q',
+        color='Company:N',
+        tooltip=['Year', 'Company', 'Trials']
+    ).interactive()
+
+
+def company_pie(company_trials, year):
+    import altair as alt
+
+    return alt.Chart(company_trials).mark_arc().encode(
+        theta=alt.Theta(field="Trials", type="quantitative"),
+        color=alt.Color(field="Company", type="nominal"),
+        tooltip=['Company', 'Trials']
+    ).properties(title=f'Total Trials in {year}')
+
+
+# ---- task3.py / task4.py: country and funding views over the aggregates
+#
+# `cube` arguments are the memory-mapped Arrow tables from aggregates.table()
+# with bitmap indexes over their phase, country and continent columns
+# (index_cube()): filters combine bitmaps and only the matching rows become a
+# frame.
+
+# indexed columns of each cube; the year is indexed as a range
+CUBE_COLUMNS = {'country_year_phase': ['phase', 'Study population'], 'sponsor_year_phase': ['phase']}
+
+
+def index_cube(name, table):
+    extra = None
+    if name == 'country_year_phase':
+        extra = {'Continent': countries.lookup(table.column('Study population').to_pandas(), ['Continent'])['Continent']}
+    return bitmaps.IndexedTable(table, CUBE_COLUMNS[name], 'year', extra)
+
+
+def country_totals(index, years, phases):
+    # Study population, country-code, totaltrials for every country with trials, largest first
+    return index.top(None, years, phases).reset_index(name='totaltrials')
+
+
+def country_series(cube, country, years, phases):
+    return cube.rows(equal={'Study population': country}, between={'year': years}, isin={'phase': phases})
+
+
+def country_maps_task3(trials, pharma):
+    return charts.country_maps(trials, pharma, 1000, 500, 'Trials by county', 'Pharma count by county')
+
+
+def country_maps_task4(trials, pharma):
+    return charts.country_maps(
+        trials, pharma, 600, 500, 'Trials count by country', 'Funding count by country',
+        country_label='Country', pharma_label='Number of funding'
+    )
+
+
+def country_line_task3(df_country):
+    import altair as alt
+
+    return alt.Chart(df_country).mark_line(point=True).encode(
+        x='year',
+        y='totaltrials',
+        color='phase',
+        tooltip=['year', 'phase', 'totaltrials']
+    ).properties(
+        width=500,
+        height=600
+    )
+
+
+def country_line_task4(df_country):
+    import altair as alt
+
+    return alt.Chart(df_country).mark_line(point=True).encode(
+        x='year:O',
+        y=alt.Y('totaltrials:Q', axis=alt.Axis(title='Count')),
+        color='phase:O',
+        tooltip=['year', 'phase', 'totaltrials']
+    ).properties(
+        width=500,
+        height=500
+    ).configure_axis(
+        gridOpacity=0
+    )
+
+
+def _funding_key(lookup, by_parent):
+    # sponsor-id -> grouping id, and grouping id -> display name
+    lookup = lookup.set_index('sponsor-id')
+    if not by_parent:
+        return None, lookup['source']
+    names = lookup.drop_duplicates('parent-id').set_index('parent-id')['parent']
+    return lookup['parent-id'], names
+
+
+def top_funding(index, years, phases, lookup, k=10, by_parent=False):
+    # source, count for the k largest sponsors (or parent groups)
+    group, names = _funding_key(lookup, by_parent)
+    if group is None:
+        top = index.top(k, years, phases)
+    else:
+        totals = index.totals(years, phases)
+        totals = totals.groupby(group.reindex(totals.index).to_numpy()).sum()
+        top = totals[totals > 0].sort_values(ascending=False, kind='stable').head(k)
+    return pd.DataFrame({'source': names.reindex(top.index).to_numpy(), 'count': top.to_numpy()})
+
+
+def funding_summary(cube, years, phases, lookup, by_parent=False):
+    # source, year, count per sponsor (or parent group)
+    group, names = _funding_key(lookup, by_parent)
+    filtered = cube.rows(between={'year': years}, isin={'phase': phases}, columns=['sponsor-id', 'year', 'count'])
+    key = filtered['sponsor-id'] if group is None else group.reindex(filtered['sponsor-id']).to_numpy()
+    summary = filtered.groupby([key, filtered['year']], observed=True)['count'].sum()
+    return pd.DataFrame({
+        'source': names.reindex(summary.index.get_level_values(0)).to_numpy(),
+        'year': summary.index.get_level_values(1),
+        'count': summary.to_numpy(),
+    })
+
+
+def _with_raw_names(counts, trials, lookup):
+    # `lookup` plus a row for every sponsor in `counts` it does not name,
+    # named by the lead line of the sponsor's raw spelling in `trials`
+    missing = pd.unique(counts['sponsor-id'][~counts['sponsor-id'].isin(lookup['sponsor-id'])])
+    if not len(missing):
+        return lookup
+    raw = trials['source'].dropna()
+    ids, _ = sponsors.encode(raw, lookup)
+    spelling = pd.Series(raw.astype(object).str.split('\n').str[0].str.strip().to_numpy(), index=ids).groupby(level=0).first().reindex(missing)
+    added = pd.DataFrame({'sponsor-id': missing, 'source': spelling.to_numpy(), 'parent': spelling.to_numpy()})
+    lookup = pd.concat([lookup[['sponsor-id', 'source', 'parent']], added], ignore_index=True)
+    lookup['parent-id'] = sponsors.parent_ids(lookup)
+    return lookup
+
+
+# cubes and indexes per search, reused while only the other filters change
+_searches = charts.SpecCache(charts.CACHE_SIZE)
+
+
+def search_tables(index, matches, lookup, country_index, sponsor_index):
+    # The country and sponsor cubes and their year indexes counting only the
+    # trials in `matches` (see search.py), on the same year and phase axes
+    # as the full indexes so the sidebar filters apply unchanged, and the
+    # sponsor lookup naming them (sponsors missing from `lookup` under
+    # their raw spelling)
+    def build():
+        country = aggregates.country_counts(index.frame('country').iloc[index.rows('country', matches)])
+        trials = index.frame('minus_ole').iloc[index.rows('minus_ole', matches)]
+        sponsor, names = aggregates.sponsor_counts(trials, lookup)
+        names = _with_raw_names(sponsor, trials, names)
+        return (
+            index_cube('country_year_phase', mapped.from_frame(country, aggregates.table('country_year_phase').schema)),
+            year_index.YearRangeIndex(country, country_index.key, 'totaltrials', like=country_index),
+            index_cube('sponsor_year_phase', mapped.from_frame(sponsor, aggregates.table('sponsor_year_phase').schema)),
+            year_index.YearRangeIndex(sponsor, sponsor_index.key, 'count', like=sponsor_index),
+            names,
+        )
+
+    key = (index.version, matches.tobytes(), aggregates.version('country_year_phase'), aggregates.version('sponsor_year_phase'))
+    return _searches.get(key, build)
+
+
+def funding_chart(top_10_funding, company_summary):
+    import altair as alt
+
+    pharma_selection = alt.selection_single(fields=['source'], bind='legend', on='click', empty="all", clear='dblclick')
+    pie_chart = alt.Chart(top_10_funding).mark_arc().encode(
+        theta=alt.Theta(field="count", type="quantitative"),
+        color=alt.Color(field="source", type="nominal"),
+        tooltip=['source', 'count']
+    ).add_selection(
+        pharma_selection
+    )
+
+    # Create the line chart with filtered data based on the selection
+    line_chart = alt.Chart(company_summary).mark_line(point=True).encode(
+        x=alt.X('year:O'),
+        y='count:Q',
+        color='source:N',
+        tooltip=['source', 'year', 'count']
+    ).transform_filter(
+        pharma_selection
+    ).interactive()
+
+    return pie_chart | line_chart
+
+
+# ---- Streamlit_matt.py: seizure types by age group and sponsor
+
+SEIZURE_TYPES = ['Focal/Partial', 'Generalized', 'Epilepsy/Seizures/Status']
+# top of the eligible ages slider, standing for "and older"
+AGE_LIMIT = 100
+
+
+def seizure_bitmaps(data):
+    # seizure type and age group bitmaps of the seizure data (see bitmaps.py)
+    return bitmaps.BitmapIndex({'indication_gen': data['indication_gen'], 'Age Group': data['Age Group']})
+
+
+def filter_ages(index, data_key, age_range):
+    # Positions of the rows eligible for some age in `age_range` (from an
+    # ages.AgeIndex), and the figure cache key for them; the full range
+    # gives None, keeping all rows, including any without a parsed age
+    low, high = age_range
+    if (low, high) == (0, AGE_LIMIT):
+        return None, data_key
+    return index.overlapping(low, np.inf if high >= AGE_LIMIT else high), (data_key, low, high)
+
+
+def seizure_rows(data, index, rows, seizure_types):
+    # rows of `data` among `rows` (all when None) of the selected seizure types
+    mask = index.any_of('indication_gen', seizure_types)
+    if rows is not None:
+        mask = np.bitwise_and(mask, index.positions(rows))
+    return data.iloc[index.rows(mask)]
+
+
+def seizure_age_counts(data):
+    return data.groupby(['Age Group', 'indication_gen'], observed=True).size().unstack(fill_value=0).sort_index()
+
+
+def seizure_age_figure(aggregated_data):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    if aggregated_data.empty:
+        # e.g. no trial open to the selected ages
+        fig.set_size_inches(10, 7)
+        ax.text(0.5, 0.5, 'No trials', ha='center', va='center', transform=ax.transAxes)
+    else:
+        aggregated_data.plot(kind='bar', figsize=(10, 7), ax=ax)
+        plt.legend(title='Seizure Type')
+    plt.title('Comparison of Seizure Types Across Age Groups')
+    plt.xlabel('Age Group')
+    plt.ylabel('Count')
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    return fig
+
+
+def seizure_age_png(aggregated_data):
+    import io
+
+    import matplotlib.pyplot as plt
+
+    fig = seizure_age_figure(aggregated_data)
+    buffer = io.BytesIO()
+    # st.pyplot's own settings
+    fig.savefig(buffer, format='png', dpi=200, bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def seizure_age_chart(data, index, rows, data_key, seizure_types=SEIZURE_TYPES):
+    # PNG of the age group chart, rasterized once per input data and seizure types
+    key = ('seizure_age', data_key, tuple(sorted(set(seizure_types))))
+    return charts.figure(key, lambda: seizure_age_png(seizure_age_counts(seizure_rows(data, index, rows, seizure_types))))
+
+
+def sponsor_counts(data):
+    # trials per canonical sponsor (see sponsors.py), largest first
+    ids, lookup = sponsors.encode(data['source'])
+    counts = np.bincount(ids[ids >= 0], minlength=len(lookup))
+    sponsor_counts = pd.Series(counts, index=lookup['source'].to_numpy())
+    sponsor_counts = sponsor_counts[sponsor_counts > 0].sort_values(ascending=False, kind='stable')
+    # Separate the top 5 sponsors and group the rest as 'Other'
+    top_sponsors = sponsor_counts.head(5)
+    other_count = sponsor_counts[5:].sum()
+    return pd.concat([top_sponsors, pd.Series({'Other': other_count})])
+
+
+def sponsor_waterfall(final_counts):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Waterfall(
+        name="20", orientation="v",
+        measure=["relative"] * len(final_counts),
+        x=final_counts.index,
+        textposition="outside",
+        text=final_counts.values,
+        y=final_counts.values,
+        connector={"line": {"color": "rgb(63, 63, 63)"}},
+    ))
+    fig.update_layout(title="Clinical Trials by Sponsor")
+    return fig
+
+
+def sponsor_waterfall_chart(data, index, rows, data_key, seizure_types):
+    # plotly JSON of the sponsor waterfall, built once per input data and selection;
+    # the order of the selected seizure types does not change the counts
+    key = ('sponsor_waterfall', data_key, tuple(sorted(set(seizure_types))))
+    return charts.figure(key, lambda: sponsor_waterfall(sponsor_counts(seizure_rows(data, index, rows, seizure_types))).to_json())
@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Cold start report for the dashboards.
+#
+# Every script is executed in a fresh interpreter (Streamlit's "bare" mode:
+# widgets return their defaults and nothing is served), timing the first
+# st.title() call (the first thing a user sees instead of a blank page) and
+# the whole run up to the last chart, and recording which heavy packages it
+# imported and how long each took (python -X importtime). This approximates
+# what a user waits for after a container restart.
+#
+#   python startup.py                       # all dashboards, build dir as is
+#   python startup.py --cold-build          # empty build dir: includes parsing the CSVs
+#   python startup.py task4.py --runs 5
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = ['task1.py', 'task3.py', 'task4.py', 'Streamlit_matt.py']
+HEAVY = ['streamlit', 'pandas', 'pyarrow', 'altair', 'vega_datasets', 'pydeck', 'matplotlib', 'plotly']
+
+RUNNER = '''
+import json, logging, runpy, sys, time
+start = time.perf_counter()
+import streamlit
+logging.disable(logging.WARNING)
+marks = {}
+_title = streamlit.title
+def title(*args, **kwargs):
+    marks.setdefault('first_paint', time.perf_counter() - start)
+    return _title(*args, **kwargs)
+streamlit.title = title
+runpy.run_path(sys.argv[1], run_name='__main__')
+seconds = time.perf_counter() - start
+heavy = sorted(name for name in json.loads(sys.argv[2]) if name in sys.modules)
+print('STARTUP ' + json.dumps({'seconds': seconds, 'first_paint': marks.get('first_paint'), 'imported': heavy}))
+'''
+
+
+def _import_times(stderr):
+    # cumulative microseconds of each top-level heavy package
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        if name in HEAVY and cumulative.isdigit():
+            times[name] = int(cumulative) / 1e6
+    return times
+
+
+def measure(script, env):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', RUNNER, script, json.dumps(HEAVY)],
+        cwd=REPO_DIR, env=env, capture_output=True, text=True,
+    )
+    lines = [line for line in result.stdout.splitlines() if line.startswith('STARTUP ')]
+    if result.returncode or not lines:
+        raise RuntimeError(f'{script} failed:\n{result.stderr[-2000:]}')
+    report = json.loads(lines[-1][len('STARTUP '):])
+    report['import_seconds'] = _import_times(result.stderr)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time a cold start of every dashboard in a fresh interpreter.')
+    parser.add_argument('scripts', nargs='*', default=SCRIPTS)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--cold-build', action='store_true', help='start every run from an empty build directory')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, BMI706_OFFLINE=os.environ.get('BMI706_OFFLINE', '1'), MPLBACKEND='Agg')
+    results = {}
+    for script in args.scripts:
+        runs = []
+        for _ in range(args.runs):
+            if args.cold_build:
+                with tempfile.TemporaryDirectory() as build_dir:
+                    runs.append(measure(script, dict(env, BMI706_BUILD_DIR=build_dir)))
+            else:
+                runs.append(measure(script, env))
+        seconds = statistics.median(run['seconds'] for run in runs)
+        first_paint = statistics.median(run['first_paint'] or run['seconds'] for run in runs)
+        imports = {name: statistics.median(run['import_seconds'].get(name, 0) for run in runs) for name in HEAVY}
+        results[script] = {'seconds': seconds, 'first_paint': first_paint, 'imported': runs[-1]['imported'], 'import_seconds': imports}
+        loaded = ', '.join(f'{name} {imports[name] * 1000:.0f}' for name in HEAVY if name in runs[-1]['imported'])
+        print(f'{script:<20} title {first_paint * 1000:6.0f} ms  done {seconds * 1000:6.0f} ms   imports (ms): {loaded}', flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import concurrent.futures
+import threading
+
+import numpy as np
+
+import aggregates
+import ages
+import datasets
+import stages
+import year_index
+
+# One read-only copy of everything the dashboards show, shared by every page
+# and every session of the Streamlit process (app.py and the scripts it
+# runs as pages).
+#
+# get() returns the current Store: the sample trials, the
+# seizure-page columns, the aggregate tables, their year indexes and the
+# bitmap indexes of the multiselect filters (see bitmaps.py). Pages
+# keep references to these frames instead of copies, so memory does not grow
+# with the number of sessions. The underlying numeric and categorical arrays
+# are marked read-only, so a page that modifies a shared frame in place
+# fails loudly instead of changing it for everyone; filtering, grouping and
+# other operations that return new frames work as usual.
+#
+# The two count cubes are kept as the memory-mapped Arrow tables (see
+# mapped.py), which are immutable and shared with every other server process
+# mapping the same files, each with a bitmap index over its filter columns
+# (stages.index_cube()); the views filter them with stages.country_series()
+# and stages.funding_summary().
+#
+# A new Store is built when a source file or an aggregate table changes.
+# Sessions still rendering with the old one keep it until they finish.
+
+TABLES = ['country_year_phase', 'sponsor_year_phase', 'pharma_country_counts', 'sponsor_lookup']
+# kept as Arrow tables rather than frames
+CUBES = ['country_year_phase', 'sponsor_year_phase']
+SEIZURE_COLUMNS = ['Age eligible for study', 'Age Group', 'indication_gen', 'source']
+# threads reading the inputs of a new Store
+MAX_WORKERS = 4
+
+_lock = threading.Lock()
+_current = None
+
+
+def _freeze(array):
+    # numpy arrays directly, and the numpy arrays inside extension arrays
+    # (categorical codes, nullable integer values and masks). Object arrays
+    # stay writeable: pandas' string comparisons reject read-only buffers.
+    for part in (array, getattr(array, '_ndarray', None), getattr(array, '_codes', None), getattr(array, '_data', None), getattr(array, '_mask', None)):
+        if isinstance(part, np.ndarray) and part.dtype != object:
+            part.flags.writeable = False
+
+
+def freeze(frame):
+    for array in frame._mgr.arrays:
+        _freeze(array)
+    return frame
+
+
+class Store:
+
+    def __init__(self, version):
+        self.version = version
+        # The inputs are independent, so they are read in parallel threads
+        # (parsing and decoding release the GIL for most of their work); the
+        # bitmap indexes over them are built once they are all in.
+        # The aggregate tables are built (if stale) up front rather than
+        # racing in every thread.
+        aggregates.version(TABLES[0])
+        with concurrent.futures.ThreadPoolExecutor(MAX_WORKERS) as pool:
+            sample = pool.submit(datasets.load, 'clinical_trials_sample')
+            seizure = pool.submit(datasets.load, 'minus_ole_generalized', SEIZURE_COLUMNS)
+            tables = {name: pool.submit(aggregates.table if name in CUBES else aggregates.load, name) for name in TABLES}
+            country_index = pool.submit(year_index.load, 'country_year_phase', ['Study population', 'country-code'], 'totaltrials')
+            sponsor_index = pool.submit(year_index.load, 'sponsor_year_phase', 'sponsor-id', 'count')
+
+        self.sample = freeze(sample.result())
+        self.sample_bitmaps = stages.sample_bitmaps(self.sample)
+        # 'Age Group' derived from the eligible ages, and an index over those ages (see ages.py)
+        seizure, bounds = ages.with_age_groups(seizure.result())
+        self.seizure = freeze(seizure)
+        self.seizure_ages = ages.AgeIndex(bounds['min_age'], bounds['max_age'])
+        self.seizure_bitmaps = stages.seizure_bitmaps(self.seizure)
+        # identifies the seizure data and the sponsor names its waterfall
+        # canonicalizes them to (see sponsors.py) in the rendered-figure cache
+        # (see charts.py)
+        self.seizure_key = (version[1], version[3])
+
+        self.country_year_phase = stages.index_cube('country_year_phase', tables['country_year_phase'].result())
+        self.sponsor_year_phase = stages.index_cube('sponsor_year_phase', tables['sponsor_year_phase'].result())
+        self.pharma_country_counts = freeze(tables['pharma_country_counts'].result())
+        self.sponsor_lookup = freeze(tables['sponsor_lookup'].result())
+
+        self.country_index = country_index.result()
+        self.sponsor_index = sponsor_index.result()
+
+
+def _version():
+    return (
+        datasets.digest('clinical_trials_sample'),
+        datasets.digest('minus_ole_generalized'),
+        datasets.digest('country_aliases'),
+        datasets.digest('sponsor_aliases'),
+        tuple(aggregates.version(name) for name in TABLES),
+    )
+
+
+def get():
+    global _current
+    version = _version()
+    with _lock:
+        if _current is None or _current.version != version:
+            _current = Store(version)
+        return _current
@@ -0,0 +1,268 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import countries
+import datasets
+import schema
+
+# Synthetic trial exports for load and scale testing.
+#
+# The generator reproduces the layout of one of the bundled trial exports
+# (country.csv, the OLE-excluded file or the generalized-indications file)
+# column for column. Distributions are fitted from that file:
+#
+# - correlated columns (age limits and age group, indications, publication
+#   flags, title/author/intervention, sex counts, geography) are drawn
+#   together by sampling whole rows of the template, so combinations stay
+#   realistic;
+# - sponsors follow a Zipf law over the real sponsors ranked by popularity,
+#   extended with synthetic names so cardinality grows with the row count;
+# - countries in country.csv's one-row-per-country layout follow the observed
+#   country frequencies, with the observed number of countries per trial,
+#   drawn without repeats; the trial's 'Continent' list and 'Country' region
+#   code are then derived from its countries, as in the template;
+# - NCT ids are unique and completion dates use the template's mix of
+#   M/D/YYYY, M/D/YY and Excel-mangled YY-Mon formats.
+#
+# Rows are produced and written chunk by chunk, so memory stays bounded by
+# --chunk-size whatever --rows is.
+#
+#   python synth.py country build/synth/country.csv --rows 1000000
+#   python synth.py minus_ole_generalized build/synth/trials.parquet --rows 5000000
+
+TEMPLATES = {
+    'country': {'id': 'Gender', 'trial_number': 'Unnamed: 0', 'sponsor_flag': 'source.1', 'per_country_rows': True},
+    'minus_ole': {'id': 'Gender', 'sponsor_flag': 'source2', 'per_country_rows': False},
+    'minus_ole_generalized': {'id': 'ID', 'sponsor_flag': 'source2', 'per_country_rows': False},
+}
+
+# columns drawn together from one template row
+GROUPS = [
+    ['Unnamed: 1', 'official_title', 'intervention_names'],
+    ['Male', 'Female', 'Total'],
+    ['phase'],
+    ['Published paper', 'Published paper  YN', 'Published result in clicnicaltrials', 'others', 'R/O', 'Is there an extension study'],
+    ['indication_sp', 'indication_gen'],
+    ['Age eligible for study', 'Lowe limit of age < 18', 'Age upper limit', 'Age code upper limit', 'Age Group'],
+    ['Country', 'Continent', 'Study population'],
+    ['year', 'year2'],
+]
+
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+MONTHS = np.array(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])
+DATE_FORMATS = {
+    'mdyyyy': r'^\d{1,2}/\d{1,2}/\d{4}$',
+    'mdyy': r'^\d{1,2}/\d{1,2}/\d{2}$',
+    'yymon': r'^\d{1,2}-[A-Za-z]{3}$',
+}
+
+
+class TrialModel:
+
+    def __init__(self, name, zipf=1.1, extra_sponsors_per_1000=1.0):
+        self.name = name
+        self.layout = TEMPLATES[name]
+        encoding = schema.SCHEMAS.get(name, {}).get('encoding')
+        self.template = pd.read_csv(datasets.path(name), dtype=str, keep_default_na=False, encoding=encoding)
+        self.columns = list(self.template.columns)
+        if self.layout['per_country_rows']:
+            trials = self.template.drop_duplicates(self.layout['id'])
+            self.trial_rows = trials.reset_index(drop=True)
+            self.countries_per_trial = self.template.groupby(self.layout['id'], sort=False).size().to_numpy()
+            frequencies = self.template['Study population'].value_counts(normalize=True)
+            self.countries = frequencies.index.to_numpy()
+            self.country_weights = frequencies.to_numpy()
+            self.country_continents = countries.lookup(pd.Series(self.countries), ['Continent'])['Continent'].astype(object).fillna('').to_numpy(dtype=object)
+            # the region code of a trial as seen in the template: the most
+            # common one for the continent of its first country and whether
+            # it lists a single country
+            first = countries.lookup(self.trial_rows['Study population'], ['Continent'])['Continent'].astype(object).fillna('').to_numpy()
+            codes = pd.DataFrame({'continent': first, 'single': self.countries_per_trial == 1, 'code': self.trial_rows['Country'].to_numpy()})
+            self.region_codes = codes.groupby(['continent', 'single'])['code'].agg(lambda code: code.value_counts().index[0])
+            self.default_region_code = codes['code'].value_counts().index[0]
+        else:
+            self.trial_rows = self.template
+
+        # days of month and date formats as seen in the template
+        dates = self.template['completion_month_year']
+        self.date_formats = np.array(list(DATE_FORMATS))
+        shares = np.array([dates.str.match(pattern).sum() for pattern in DATE_FORMATS.values()], dtype=float)
+        self.date_format_weights = shares / shares.sum() if shares.sum() else np.full(len(shares), 1 / len(shares))
+        days = dates.str.extract(r'^\d{1,2}/(\d{1,2})/')[0].dropna().astype(int).value_counts(normalize=True)
+        self.days = days.index.to_numpy() if len(days) else np.array([1])
+        self.day_weights = days.to_numpy() if len(days) else np.array([1.0])
+
+        # sponsors with their industry (1) / academic (2) flag, most popular first
+        trials = self.template.drop_duplicates(self.layout['id'])
+        flag = self.layout['sponsor_flag']
+        ranked = trials['source'].value_counts()
+        flags = trials.drop_duplicates('source').set_index('source')[flag]
+        self.real_sponsors = ranked.index.to_numpy()
+        self.real_sponsor_flags = flags.reindex(ranked.index).to_numpy()
+        self.zipf = zipf
+        self.extra_sponsors_per_1000 = extra_sponsors_per_1000
+
+    def sponsors_for(self, trials):
+        # real sponsors plus synthetic ones in the long tail, Zipf weighted by rank
+        extra = int(trials * self.extra_sponsors_per_1000 / 1000)
+        names = np.concatenate([self.real_sponsors, np.array([f'Synthetic Sponsor {i:05d}' for i in range(1, extra + 1)], dtype=object)])
+        flags = np.concatenate([self.real_sponsor_flags, np.resize(self.real_sponsor_flags, extra)])
+        weights = 1.0 / np.arange(1, len(names) + 1) ** self.zipf
+        return names, flags, weights / weights.sum()
+
+    def _dates(self, rng, years):
+        n = len(years)
+        year_numbers = pd.to_numeric(pd.Series(years), errors='coerce').to_numpy()
+        months = rng.integers(1, 13, n)
+        days = np.minimum(rng.choice(self.days, n, p=self.day_weights), DAYS_IN_MONTH[months - 1])
+        formats = rng.choice(self.date_formats, n, p=self.date_format_weights)
+        yyyy = pd.Series(years).str.slice(0, 4)
+        yy = yyyy.str.slice(2, 4)
+        m = pd.Series(months).astype(str)
+        d = pd.Series(days).astype(str)
+        out = np.where(formats == 'mdyyyy', (m + '/' + d + '/' + yyyy).to_numpy(), '')
+        out = np.where(formats == 'mdyy', (m + '/' + d + '/' + yy).to_numpy(), out)
+        short = pd.Series(np.where(np.isnan(year_numbers), 0, year_numbers % 100).astype(int)).astype(str)
+        out = np.where(formats == 'yymon', (short + '-' + pd.Series(MONTHS[months - 1])).to_numpy(), out)
+        # no completion date for unknown years and the 1900 placeholder
+        return np.where(np.isnan(year_numbers) | (year_numbers == 1900), '', out)
+
+    def chunk(self, rng, trials, first_trial, sponsors):
+        # `trials` synthetic trials in the template's layout
+        picks = {tuple(group): rng.integers(0, len(self.trial_rows), trials) for group in GROUPS}
+        frame = pd.DataFrame(index=pd.RangeIndex(trials))
+        for group, rows in picks.items():
+            present = [column for column in group if column in self.columns]
+            for column in present:
+                frame[column] = self.trial_rows[column].to_numpy()[rows]
+        for column in self.columns:
+            if column not in frame:
+                frame[column] = self.trial_rows[column].to_numpy()[rng.integers(0, len(self.trial_rows), trials)]
+
+        numbers = np.arange(first_trial, first_trial + trials)
+        frame[self.layout['id']] = 'NCT' + pd.Series(numbers + 10_000_000).astype(str).str.zfill(8).to_numpy()
+        names, flags, weights = sponsors
+        picked = rng.choice(len(names), trials, p=weights)
+        frame['source'] = names[picked]
+        frame[self.layout['sponsor_flag']] = flags[picked]
+        frame['completion_month_year'] = self._dates(rng, frame['year'].to_numpy())
+
+        if self.layout['per_country_rows']:
+            per_trial = np.minimum(rng.choice(self.countries_per_trial, trials), len(self.countries))
+            drawn = self._draw_countries(rng, per_trial)
+            frame['Country'], frame['Continent'] = self._geography(drawn, per_trial)
+            frame = frame.loc[frame.index.repeat(per_trial)].reset_index(drop=True)
+            frame['Study population'] = self.countries[drawn]
+            frame[self.layout['trial_number']] = np.repeat(numbers, per_trial)
+        return frame[self.columns]
+
+    def _draw_countries(self, rng, per_trial):
+        # Country positions, trial after trial, `per_trial` distinct ones each,
+        # weighted by frequency: every trial keeps its countries with the
+        # largest random key u ** (1 / weight) (Efraimidis-Spirakis)
+        keys = rng.random((len(per_trial), len(self.countries))) ** (1 / self.country_weights)
+        order = np.argsort(-keys, axis=1)
+        return order[np.arange(len(self.countries)) < per_trial[:, None]]
+
+    def _geography(self, drawn, per_trial):
+        # 'Country' region code and 'Continent' list of each trial from its drawn countries
+        trial = np.repeat(np.arange(len(per_trial)), per_trial)
+        firsts = np.concatenate([[0], np.cumsum(per_trial)[:-1]])
+        first = self.country_continents[drawn[firsts]]
+        keys = pd.MultiIndex.from_arrays([first, per_trial == 1])
+        codes = self.region_codes.reindex(keys).fillna(self.default_region_code).to_numpy()
+        listed = pd.DataFrame({'trial': trial, 'continent': self.country_continents[drawn]})
+        listed = listed[listed['continent'] != ''].drop_duplicates()
+        joined = listed.groupby('trial', sort=False)['continent'].agg('\n'.join)
+        return codes, joined.reindex(np.arange(len(per_trial)), fill_value='').to_numpy()
+
+    def trials_for_rows(self, rows):
+        if self.layout['per_country_rows']:
+            return max(1, int(round(rows / self.countries_per_trial.mean())))
+        return rows
+
+
+def _arrow_schema(name, columns):
+    import pyarrow as pa
+
+    types = {
+        'Int8': pa.int8(), 'Int16': pa.int16(), 'Int32': pa.int32(), 'Int64': pa.int64(),
+        'int8': pa.int8(), 'int16': pa.int16(), 'int32': pa.int32(), 'int64': pa.int64(),
+        'float32': pa.float32(), 'float64': pa.float64(),
+    }
+    dtype = schema.SCHEMAS.get(name, {}).get('dtype', {})
+    return pa.schema([(column, types.get(str(dtype.get(column)), pa.string())) for column in columns])
+
+
+def _to_arrow(frame, arrow_schema):
+    import pyarrow as pa
+
+    arrays = []
+    for field in arrow_schema:
+        values = frame[field.name]
+        if pa.types.is_string(field.type):
+            arrays.append(pa.array(values.where(values != '', None), type=field.type, from_pandas=True))
+        else:
+            arrays.append(pa.array(pd.to_numeric(values, errors='coerce'), type=field.type, from_pandas=True, safe=False))
+    return pa.Table.from_arrays(arrays, schema=arrow_schema)
+
+
+def generate(name, out, rows, chunk_size=100_000, seed=42, zipf=1.1):
+    # writes `rows` synthetic rows (approximately, for country.csv's layout) to
+    # `out`; .parquet/.feather produce typed columnar output, anything else CSV
+    model = TrialModel(name, zipf=zipf)
+    rng = np.random.default_rng(seed)
+    total_trials = model.trials_for_rows(rows)
+    sponsors = model.sponsors_for(total_trials)
+    trials_per_chunk = max(1, model.trials_for_rows(chunk_size))
+    columnar = os.path.splitext(out)[1] in ('.parquet', '.feather', '.arrow')
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    tmp = out + '.tmp'
+
+    writer = None
+    written = 0
+    try:
+        if columnar:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            arrow_schema = _arrow_schema(name, model.columns)
+            if out.endswith('.parquet'):
+                writer = pq.ParquetWriter(tmp, arrow_schema)
+            else:
+                writer = pa.ipc.new_file(tmp, arrow_schema)
+        encoding = schema.SCHEMAS.get(name, {}).get('encoding')
+        for first in range(0, total_trials, trials_per_chunk):
+            frame = model.chunk(rng, min(trials_per_chunk, total_trials - first), first, sponsors)
+            if columnar:
+                writer.write_table(_to_arrow(frame, arrow_schema))
+            else:
+                frame.to_csv(tmp, mode='a' if written else 'w', header=not written, index=False, encoding=encoding)
+            written += len(frame)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp, out)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic trial export in the layout of a bundled one.')
+    parser.add_argument('layout', choices=list(TEMPLATES))
+    parser.add_argument('out')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--zipf', type=float, default=1.1, help='sponsor popularity skew')
+    args = parser.parse_args(argv)
+    written = generate(args.layout, args.out, args.rows, args.chunk_size, args.seed, args.zipf)
+    print(f'{written} rows written to {args.out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,33 +1,28 @@
 import streamlit as st
-import pandas as pd
-import altair as alt
-import pydeck as pdk
-from vega_datasets import data
 
-# Load the dataset
-#this dataframe contain country codes for geospatial data
-country_df = pd.read_csv('https://raw.githubusercontent.com/hms-dbmi/bmi706-2022/main/cancer_data/country_codes.csv', dtype = {'conuntry-code': str})
-#this dataframe contain all the raw data required regarding trials information
-df=pd.read_csv('https://raw.githubusercontent.com/wyeekong/bmi706brainstorm/main/country.csv')
-df['totaltrials'] = df.groupby(['Study population', 'year', 'phase'])['Study population'].transform('count')
-merged_df = pd.merge(df, country_df[['Country', 'country-code']], left_on='Study population',right_on='Country', how='left')
-merged_df = merged_df.dropna()
-merged_df['year'] = merged_df['year'].astype(int)
-
-#this dataframe contain pharma and country of origin
-pharma=pd.read_csv('https://raw.githubusercontent.com/wyeekong/bmi706brainstorm/main/pharma_country.csv', encoding='latin1')
-merged_pharma= pd.merge(pharma, country_df[['Country', 'country-code']], left_on='Study population',right_on='Country', how='left')
+import stages
+import store
 
 st.set_page_config(layout="wide")
 
-# Streamlit app layout
+# Streamlit app layout; the title is sent before any data is loaded so a cold
+# start does not show a blank page
 st.title('Antiseizure Clinical Trials Dashboard')
 
-year = st.slider('Select Year', min_value=min(merged_df['year']), max_value=max(merged_df['year']), value=(min(merged_df['year']), max(merged_df['year'])))
-df_filtered = merged_df[merged_df['year'].between(year[0], year[1])]
+# The pre-aggregated tables (see aggregates.py), shared read-only by every session (see store.py)
+data = store.get()
+#merged_df: the number of trials per country, country code, year and phase
+merged_df = data.country_year_phase
+#pharma_total: the number of pharma companies per country of origin
+pharma_total = data.pharma_country_counts
+#year-range index answering per-country totals without regrouping on every slider move
+country_index = data.country_index
+
+year = st.slider('Select Year', min_value=country_index.first_year, max_value=country_index.last_year, value=(country_index.first_year, country_index.last_year))
 
-selected_phases = st.multiselect('Select Phase(s)', options=df_filtered['phase'].unique(), default=df_filtered['phase'].unique())
-df_filtered_by_phase = df_filtered[df_filtered['phase'].isin(selected_phases)]
+phases_in_range = country_index.phases_in(year)
+selected_phases = st.multiselect('Select Phase(s)', options=phases_in_range, default=phases_in_range)
+country_totals = stages.country_totals(country_index, year, selected_phases)
 
 # Create columns for layout
 left_column, right_column = st.columns([2, 15])
@@ -35,106 +30,25 @@ left_column, right_column = st.columns([2, 15])
 with left_column:
     # Country Ranking List
     st.subheader('Country Ranking List')
-    country_rank = df_filtered_by_phase.groupby('Study population')['totaltrials'].sum().reset_index().sort_values('totaltrials', ascending=False)
-    for _, row in country_rank.iterrows():
-        st.write(f"{row['Study population']}: {row['totaltrials']}")
+    st.dataframe(stages.ranking_frame(country_totals, 'Study population', 'totaltrials'), hide_index=True, use_container_width=True)
 
   
 
 with right_column:
     # Geospatial Chart
     st.subheader('Geospatial Chart')
-    # Vega_datasets world data
-    source = alt.topo_feature(data.world_110m.url, 'countries')
-    width = 1000
-    height  = 500
-    project = 'equirectangular'
-
-    # a gray map using as the visualization background
-    background = alt.Chart(source
-    ).mark_geoshape(
-        fill='#aaa',
-        stroke='white'
-    ).properties(
-        width=width,
-        height=height
-    ).project(project)
-    
-    aggregated_data = df_filtered_by_phase.groupby(['Study population','country-code'])['totaltrials'].sum().reset_index()
-    pharma_total = merged_pharma.groupby(['Study population', 'country-code']).size().reset_index(name='count')
-
-    selector = alt.selection_single(fields=['Study population'], on='click', empty="all", clear='dblclick')
-
-    chart_base = alt.Chart(source
-    ).properties(
-        width=width,
-        height=height
-    ).project(project
-    ).add_selection(selector
-    ).transform_lookup(
-        lookup="id",
-        from_=alt.LookupData(aggregated_data, "country-code", ["Study population","totaltrials"]),
-    )
-
-    
-    total_trials_sum = aggregated_data['totaltrials'].max()
-    rate_scale = alt.Scale(domain=[0, total_trials_sum], scheme='oranges')
-    rate_color = alt.Color(field="totaltrials", type="quantitative", scale=rate_scale)
-
-    chart_rate = chart_base.mark_geoshape().encode(
-        color=rate_color,
-        tooltip=['Study population:N','totaltrials:Q']
-    ).transform_filter(selector
-    ).properties(
-        title=f'Trials by county'
-    )
-
-    pharma_chart_base = alt.Chart(source
-    ).properties(
-        width=width,
-        height=height
-    ).project(project
-    ).add_selection(selector
-    ).transform_lookup(
-        lookup="id",
-        from_=alt.LookupData(pharma_total, "country-code", ["Study population","count"]),
-    )
-
-    pharma_trials_sum = pharma_total['count'].max()
-    pharma_rate_scale = alt.Scale(domain=[0, pharma_trials_sum], scheme='yellowgreenblue')
-    pharma_rate_color = alt.Color(field="count", type="quantitative", scale=pharma_rate_scale)
-
-    pharma_chart_rate = pharma_chart_base.mark_geoshape().encode(
-        color=pharma_rate_color,
-        tooltip=['Study population:N','count:Q']
-    ).transform_filter(selector
-    ).properties(
-        title=f'Pharma count by county'
-    )
-
-    chart2 = alt.vconcat(background + chart_rate, background + pharma_chart_rate
-    ).resolve_scale(
-        color='independent'
-    )
+    # Cached choropleth spec for the current filters (see charts.py)
+    chart2 = stages.country_maps_task3(country_totals, pharma_total)
 
-    st.altair_chart(chart2)
+    st.vega_lite_chart(chart2)
 
     # Country Selector
-    country_trials = df_filtered_by_phase.groupby('Study population')['totaltrials'].sum()
-    top_countries = country_trials.sort_values(ascending=False).index[:20]
+    top_countries = country_totals['Study population'][:20]
     country = st.selectbox('Select Country', options=top_countries)
-    df_country = df_filtered_by_phase[df_filtered_by_phase['Study population'] == country]
+    df_country = stages.country_series(merged_df, country, year, selected_phases)
 
     # Line and Dot Graph for the selected country
     st.subheader(f'Trials Over Years for {country}')
-    line_chart = alt.Chart(df_country).mark_line(point=True).encode(
-        x='year',
-        y='totaltrials',
-        color='phase',
-        tooltip=['year', 'phase', 'totaltrials']
-    ).properties(
-        width=500,
-        height=600
-    )#.interactive()
+    line_chart = stages.country_line_task3(df_country)
 
     st.altair_chart(line_chart, use_container_width=True)
\ No newline at end of file
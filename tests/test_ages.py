@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import ages
+
+INF = np.inf
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('18-65', (18, 65)),
+    ('12_65', (12, 65)),
+    ('18 Years and older', (18, INF)),
+    ('65 or over', (65, INF)),
+    ('65', (65, 65)),
+    ('6 Months to 2 Years', (0.5, 2)),
+    ('1 month - 16 years', (1 / 12, 16)),
+    # a bound without a unit takes the other bound's
+    ('6-24 months', (0.5, 2)),
+    ('2 weeks-1 year', (14 / 365.25, 1)),
+    ('28 days - 17 years', (28 / 365.25, 17)),
+    ('up to 48 hours', (0, 48 / 8766)),
+    ('N/A', (np.nan, np.nan)),
+    ('children', (np.nan, np.nan)),
+    (None, (np.nan, np.nan)),
+])
+def test_parse(text, expected):
+    bounds = ages.parse(pd.Series([text], dtype=object))
+    np.testing.assert_allclose(bounds[['min_age', 'max_age']].to_numpy()[0], expected)
+
+
+def test_parse_categorical_keeps_rows():
+    values = pd.Series(['18-65', None, '18-65', '2-11'], dtype='category', index=[5, 6, 7, 8])
+    bounds = ages.parse(values)
+    assert list(bounds.index) == [5, 6, 7, 8]
+    np.testing.assert_array_equal(bounds['max_age'].to_numpy(), [65, np.nan, 65, 11])
+
+
+@pytest.mark.parametrize('min_age, max_age, group', [
+    (60, INF, 'Eldely'),
+    (59.9, INF, 'Adult'),
+    (15, 65, 'Adult'),
+    (14.9, 18.1, 'Children/Adult'),
+    (2, 18, 'Children'),
+    (1, 2, 'Children'),
+    (0.5, 2, 'Newborn'),
+    (0.5, 2.1, 'Newborn/Children'),
+    (0, 18, 'Newborn/Children'),
+    (0, 65, 'Children/Adult'),
+])
+def test_age_group_boundaries(min_age, max_age, group):
+    assert list(ages.age_group([min_age], [max_age])) == [group]
+
+
+def test_age_group_unknown():
+    assert pd.isna(ages.age_group([np.nan], [np.nan])[0])
+
+
+def test_with_age_groups_keeps_unparsed_labels():
+    frame = pd.DataFrame({
+        'Age eligible for study': ['18-65', 'children', '1 month - 16 years'],
+        'Age Group': ['Children', 'Children', 'Adult'],
+    })
+    derived, _ = ages.with_age_groups(frame)
+    assert list(derived['Age Group']) == ['Adult', 'Children', 'Newborn/Children']
+    # the input frame is left as it was
+    assert list(frame['Age Group']) == ['Children', 'Children', 'Adult']
+
+
+def _bounds(seed=3, rows=500):
+    # a few dozen distinct intervals, some open-ended, some unknown
+    rng = np.random.default_rng(seed)
+    low = rng.choice([0, 0.5, 1, 2, 12, 16, 18, 40, 65], rows).astype(float)
+    high = low + rng.choice([0, 1, 10, 30, INF], rows)
+    low[rng.random(rows) < 0.05] = np.nan
+    return low, high
+
+
+@pytest.mark.parametrize('low, high', [(0, 1), (2, 11), (17.5, 18), (18, 18), (66, 90), (100, 120), (0, INF), (5, 4)])
+def test_overlapping_matches_brute_force(low, high):
+    min_age, max_age = _bounds()
+    index = ages.AgeIndex(min_age, max_age)
+    # NaN compares False, so unknown intervals never match
+    expected = np.flatnonzero((min_age <= high) & (max_age >= low))
+    np.testing.assert_array_equal(index.overlapping(low, high), expected)
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import bitmaps
+import mapped
+
+
+def _frame(n_rows=1003, seed=0):
+    # a row count that is not a multiple of 8, missing values and a categorical column
+    rng = np.random.default_rng(seed)
+    phases = rng.choice(['Phase 1', 'Phase 2', 'Phase 3', None], n_rows)
+    countries = rng.choice(['Brazil', 'France', 'Japan', 'Kenya'], n_rows)
+    years = rng.integers(1995, 2024, n_rows).astype(float)
+    years[rng.random(n_rows) < 0.05] = np.nan
+    return pd.DataFrame({
+        'phase': phases,
+        'country': pd.Categorical(countries),
+        'year': years,
+        'count': rng.integers(1, 50, n_rows),
+    })
+
+
+def _indexed(frame):
+    return bitmaps.IndexedTable(mapped.from_frame(frame), ['phase', 'country'], 'year')
+
+
+def _expected(frame, mask):
+    return frame[mask].reset_index(drop=True)
+
+
+CASES = [
+    ({'equal': {'country': 'France'}}, lambda f: f['country'] == 'France'),
+    ({'isin': {'phase': ['Phase 1', 'Phase 3']}}, lambda f: f['phase'].isin(['Phase 1', 'Phase 3'])),
+    ({'between': {'year': (2000, 2010)}}, lambda f: f['year'].between(2000, 2010)),
+    ({'between': {'year': (2010, 2010)}}, lambda f: f['year'] == 2010),
+    (
+        {'equal': {'country': 'Japan'}, 'between': {'year': (1990, 2005)}, 'isin': {'phase': ['Phase 2']}},
+        lambda f: (f['country'] == 'Japan') & f['year'].between(1990, 2005) & (f['phase'] == 'Phase 2'),
+    ),
+    ({'isin': {'phase': []}}, lambda f: pd.Series(False, index=f.index)),
+    ({'isin': {'country': ['Peru', 'Kenya']}}, lambda f: f['country'] == 'Kenya'),
+    ({'between': {'year': (2030, 2040)}}, lambda f: pd.Series(False, index=f.index)),
+]
+
+
+@pytest.mark.parametrize('conditions, mask', CASES)
+def test_rows_match_pandas_masks(conditions, mask):
+    frame = _frame()
+    result = _indexed(frame).rows(**conditions)
+    pd.testing.assert_frame_equal(result, _expected(frame, mask(frame)), check_categorical=False)
+
+
+def test_no_condition_keeps_every_row():
+    frame = _frame()
+    pd.testing.assert_frame_equal(_indexed(frame).rows(), frame, check_categorical=False)
+
+
+def test_selected_columns():
+    frame = _frame()
+    result = _indexed(frame).rows(isin={'phase': ['Phase 2']}, columns=['year', 'count'])
+    expected = _expected(frame.loc[:, ['year', 'count']], frame['phase'] == 'Phase 2')
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_extra_column_is_indexed():
+    frame = _frame()
+    region = np.where(frame['country'].isin(['Brazil', 'Kenya']), 'South', 'North')
+    table = bitmaps.IndexedTable(mapped.from_frame(frame), ['phase'], 'year', {'region': region})
+    result = table.rows(equal={'region': 'South'}, isin={'phase': ['Phase 1']})
+    pd.testing.assert_frame_equal(result, _expected(frame, (region == 'South') & (frame['phase'] == 'Phase 1')), check_categorical=False)
+
+
+def test_positions_and_with_conditions():
+    frame = _frame()
+    index = _indexed(frame).index
+    rows = np.arange(0, len(frame), 7)
+    mask = np.bitwise_and(index.any_of('country', ['Brazil']), index.positions(rows))
+    expected = np.intersect1d(rows, np.flatnonzero(frame['country'] == 'Brazil'))
+    np.testing.assert_array_equal(index.rows(mask), expected)
+
+
+def test_range_on_unindexed_column():
+    with pytest.raises(KeyError):
+        _indexed(_frame()).rows(between={'count': (1, 5)})
+
+
+def test_columns_of_different_lengths():
+    with pytest.raises(ValueError):
+        bitmaps.BitmapIndex({'a': ['x', 'y'], 'b': ['x']})
+
+
+def test_len_and_schema():
+    frame = _frame(10)
+    table = _indexed(frame)
+    assert len(table) == 10
+    assert table.schema == pa.Table.from_pandas(frame, preserve_index=False).schema
@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+
+import aggregates
+import datasets
+import ingest
+import year_index
+
+
+@pytest.fixture
+def build_dirs(tmp_path, monkeypatch):
+    # batches and aggregate tables in a scratch directory; the exports and
+    # their Arrow copies are shared with the real build
+    monkeypatch.setattr(ingest, 'STORE_DIR', str(tmp_path / 'ingest'))
+    monkeypatch.setattr(aggregates, 'AGGREGATES_DIR', str(tmp_path / 'aggregates'))
+    monkeypatch.setattr(aggregates, 'MANIFEST', str(tmp_path / 'aggregates' / 'manifest.json'))
+    monkeypatch.setattr(aggregates, '_tables', {})
+    monkeypatch.setattr(aggregates, '_fresh', None)
+    monkeypatch.setattr(year_index, '_indexes', {})
+    aggregates.build()
+
+
+def _batch(name, **changes):
+    rows = {
+        'country': {
+            'Gender': ['NCT90000001', 'NCT90000002', 'NCT90000003, NCT90000004'],
+            'Study population': ['France', 'United States of America', 'Brazil'],
+            'year': ['2021', '2021', '2030'],
+            'phase': ['Phase 2', 'Phase 3', 'Phase 1/Phase 2'],
+        },
+        'minus_ole': {
+            'Gender': ['NCT90000001', 'NCT90000002', 'NCT90000003'],
+            # the last sponsor is not in the exports yet
+            'source': ['Pfizer', 'UCB Pharma', 'Acme Neurology Ltd'],
+            'year': ['2021', '2021', '2030'],
+            'phase': ['Phase 2', 'Phase 3', 'Phase 4'],
+        },
+    }[name]
+    frame = pd.DataFrame(rows)
+    for column, (row, value) in changes.items():
+        frame.loc[row, column] = value
+    return frame
+
+
+def _sorted(table):
+    return table.sort_values(list(table.columns)).reset_index(drop=True)
+
+
+INDEXES = {
+    'country': (['Study population', 'country-code'], 'totaltrials'),
+    'minus_ole': ('sponsor-id', 'count'),
+}
+
+
+@pytest.mark.parametrize('name', ['country', 'minus_ole'])
+def test_append_matches_rebuild(build_dirs, name):
+    table_name = aggregates.DELTAS[name][0]
+    key, count = INDEXES[name]
+    # loaded before the batch, so append() updates it by delta
+    year_index.load(table_name, key, count)
+
+    ingest.append(name, _batch(name))
+
+    # what aggregates.build() computes from the exports and every batch
+    frames = datasets.load_many(aggregates.COLUMNS)
+    expected = aggregates.build_tables(*[
+        ingest.with_batches(source, frame, columns) for (source, columns), frame in zip(aggregates.COLUMNS.items(), frames)
+    ])
+    for table, rebuilt in expected.items():
+        pd.testing.assert_frame_equal(_sorted(aggregates.load(table)), _sorted(rebuilt), check_categorical=False, obj=table)
+
+    appended = year_index.load(table_name, key, count)
+    rebuilt = year_index.YearRangeIndex(expected[table_name], key, count)
+    for years in [(1990, 2020), (2021, 2021), (2000, 2035)]:
+        for phases in [None, ['Phase 2', 'Phase 3']]:
+            pd.testing.assert_series_equal(appended.totals(years, phases).sort_index(), rebuilt.totals(years, phases).sort_index())
+
+
+@pytest.mark.parametrize('changes, message', [
+    ({'Gender': (0, 'NCT123')}, "Gender='NCT123' is not an NCT id"),
+    ({'phase': (1, 'Phase 5')}, "phase='Phase 5' is not one of"),
+    ({'year': (2, '1900')}, 'year=1900 is not between'),
+    ({'year': (2, '2999')}, 'year=2999 is not between'),
+    ({'Study population': (0, 'Atlantis')}, "Study population='Atlantis' is not a known country"),
+])
+def test_validate_rejects(changes, message):
+    with pytest.raises(ValueError, match=message):
+        ingest.validate('country', _batch('country', **changes))
+
+
+def test_duplicate_batch(build_dirs):
+    ingest.append('country', _batch('country'))
+    with pytest.raises(ValueError, match='already ingested'):
+        ingest.append('country', _batch('country'))
+    assert ingest.counts() == {'country': 1}
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import search
+
+
+def test_words():
+    found = search.words(['SPM 927 tablets vs placebo', 'KeppraÔÎ and the Levetiracetam', 'Phase 3 BIA 2-093', None])
+    assert found.groupby(level=0).agg(list).to_dict() == {
+        # codes are joined and keep their parts; formulations and fillers are dropped
+        0: ['spm', '927', 'spm927', 'placebo'],
+        # mis-decoded symbols split off, accents and case stripped
+        1: ['keppra', 'oi', 'levetiracetam'],
+        2: ['phase', '3', 'phase3', 'bia', '2', '093', 'bia2093'],
+    }
+
+
+def test_query_words_join_codes_only():
+    assert search.words(['SPM-927', 'bia 2-093 sodium'], keep_parts=False).tolist() == ['spm927', 'bia2093']
+
+
+FRAMES = {
+    'country': pd.DataFrame({
+        'Gender': ['NCT00000001', 'NCT00000002', 'NCT00000002', 'NCT00000003', None],
+        'official_title': ['Levetiracetam in partial seizures', 'Vimpat versus placebo', 'Vimpat versus placebo',
+                           'Topiramate tablets in children', 'Untitled'],
+        'intervention_names': ['levetiracetam', 'lacosamide', 'lacosamide', 'topiramate', 'placebo'],
+        'source': ['UCB Pharma', 'UCB Pharma', 'UCB Pharma', 'Janssen', 'Pfizer'],
+    }),
+    'minus_ole': pd.DataFrame({
+        'Gender': ['NCT00000001', 'NCT00000004', 'NCT00000005'],
+        'official_title': ['Levetiracetam in partial seizures', 'Keppra XR monotherapy', 'SPM 927 open label'],
+        'intervention_names': ['levetiracetam', 'Keppra', 'SPM 927'],
+        'source': ['UCB Pharma', 'UCB Pharma', 'Schwarz Pharma'],
+    }),
+    'minus_ole_generalized': pd.DataFrame({
+        'ID': ['NCT00000003', 'NCT00000005'],
+        'indication_sp': ['Lennox-Gastaut syndrome', 'Partial-onset seizures'],
+    }),
+}
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    # an index over FRAMES, with the synonyms of drug_aliases.csv
+    monkeypatch.setattr(search, 'SEARCH_DIR', str(tmp_path))
+    monkeypatch.setattr(search, '_frames', lambda: FRAMES)
+    search.build()
+    return search.SearchIndex('test')
+
+
+def _ids(index, query):
+    matches = index.lookup(query)
+    return None if matches is None else sorted(index.trials[matches])
+
+
+def test_synonyms(index):
+    # brand names and codes find the trials naming the generic drug, and back
+    assert _ids(index, 'keppra') == ['NCT00000001', 'NCT00000004']
+    assert _ids(index, 'levetiracetam') == ['NCT00000001', 'NCT00000004']
+    assert _ids(index, 'vimpat') == ['NCT00000002', 'NCT00000005']
+    assert _ids(index, 'SPM-927') == ['NCT00000002', 'NCT00000005']
+
+
+def test_prefix(index):
+    assert _ids(index, 'levet') == ['NCT00000001', 'NCT00000004']
+    assert _ids(index, 'part seiz') == ['NCT00000001', 'NCT00000005']
+    assert _ids(index, 'lennox') == ['NCT00000003']
+    assert _ids(index, 'levet lennox') == []
+    assert _ids(index, 'the of') is None
+
+
+@pytest.mark.parametrize('word', ['placebo', 'partial', 'topiramate', 'ucb', 'pharma', 'seizures'])
+def test_rows_match_contains(index, word):
+    # the rows of each counted dataset whose trial mentions `word` anywhere
+    texts = pd.concat([
+        frame.set_index(search.SOURCES[name][0])[search.SOURCES[name][1]].stack()
+        for name, frame in FRAMES.items()
+    ])
+    mentioned = texts.index.get_level_values(0)[texts.str.contains(word, case=False).to_numpy()]
+    for name in search.COUNTED:
+        ids = FRAMES[name]['Gender']
+        expected = np.flatnonzero(ids.isin(mentioned) & ids.notna())
+        np.testing.assert_array_equal(index.rows(name, index.lookup(word)), expected)
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import sponsors
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('UCB Pharma', 'ucb pharma'),
+    ('UCB PHARMA\n', 'ucb pharma'),
+    # legal suffixes, however punctuated and however many
+    ('UCB Pharma S.A.', 'ucb pharma'),
+    ('Novartis AG, Ltd.', 'novartis'),
+    ('Johnson & Johnson Pharmaceutical Research & Development, L.L.C.', 'johnson and johnson pharmaceutical research and development'),
+    # only the lead sponsor counts
+    ('  Pfizer Inc.\nSome Collaborator Co', 'pfizer'),
+    ('Boston Children_s Hospital', 'boston children s hospital'),
+    # a suffix inside the name stays
+    ('Co-Operative Trials Group', 'co operative trials group'),
+    (None, ''),
+])
+def test_normalize(name, expected):
+    assert sponsors.normalize([name]).tolist() == [expected]
+
+
+def test_encode_known_sponsors():
+    table = sponsors.sponsors()
+    ids, lookup = sponsors.encode(table['source'].head(5).str.upper())
+    np.testing.assert_array_equal(ids, table['sponsor-id'].head(5).to_numpy())
+    assert len(lookup) == len(table)
+
+
+def test_encode_unknown_sponsors_get_stable_ids():
+    known = len(sponsors.sponsors())
+    ids, lookup = sponsors.encode(['Acme Neurology Ltd', 'UCB Pharma', None, 'ACME NEUROLOGY', 'Zeta Labs'])
+    acme, ucb, missing, acme_again, zeta = ids
+    # after the known sponsors, one id per normalized spelling
+    assert sorted({acme, zeta}) == [known, known + 1]
+    assert acme_again == acme
+    assert ucb < known and missing == -1
+    # unknown sponsors are their own parent
+    added = lookup.set_index('sponsor-id').loc[[acme, zeta]]
+    assert added['parent'].tolist() == added['source'].tolist()
+
+    # encoding against the returned lookup keeps the ids and only adds new sponsors
+    again, extended = sponsors.encode(pd.Series(['Zeta Labs Inc.', 'New Sponsor', 'acme neurology']), lookup)
+    assert [again[0], again[2]] == [zeta, acme]
+    assert again[1] == known + 2
+    pd.testing.assert_frame_equal(extended.head(len(lookup)), lookup)
+    assert len(extended) == len(lookup) + 1
+
+
+def test_unmatched():
+    known = sponsors.sponsors()['source'].iloc[0]
+    assert sponsors.unmatched([known, f'{known} Inc.', 'Acme Neurology', None, 'Acme Neurology']) == ['Acme Neurology']
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import year_index
+
+
+def _table(rows):
+    return pd.DataFrame(rows, columns=['country', 'phase', 'year', 'count'])
+
+
+BASE = _table([
+    ('France', 'P1', 2000, 3),
+    ('France', 'P2', 2001, 4),
+    ('Japan', 'P2', 2003, 5),
+])
+
+
+def test_totals_on_the_axes_of_another_index():
+    base = year_index.YearRangeIndex(BASE, 'country', 'count')
+    part = year_index.YearRangeIndex(BASE.iloc[1:], 'country', 'count', like=base)
+    assert list(part.phases) == ['P1', 'P2']
+    assert part.totals((2000, 2003)).to_dict() == {'France': 4, 'Japan': 5}
+    assert part.totals((2000, 2003), ['P1']).to_dict() == {'France': 0, 'Japan': 0}
+
+
+def test_phase_missing_from_like():
+    base = year_index.YearRangeIndex(BASE, 'country', 'count')
+    with pytest.raises(ValueError, match='P9'):
+        year_index.YearRangeIndex(_table([('France', 'P9', 2001, 5)]), 'country', 'count', like=base)
+
+
+@pytest.mark.parametrize('year', [1990, 1999, 2004, 2050])
+def test_year_outside_like(year):
+    base = year_index.YearRangeIndex(BASE, 'country', 'count')
+    with pytest.raises(ValueError, match=str(year)):
+        year_index.YearRangeIndex(_table([('France', 'P1', year, 5)]), 'country', 'count', like=base)
+
+
+def _counts(seed=1, rows=2000):
+    # a country_year_phase-like table with gaps in the years
+    rng = np.random.default_rng(seed)
+    countries = np.array(['Brazil', 'France', 'Japan', 'Kenya', 'Peru', 'Spain'])
+    frame = pd.DataFrame({
+        'Study population': rng.choice(countries, rows),
+        'year': rng.choice(np.r_[1990:2000, 2003:2020], rows),
+        'phase': rng.choice(['Phase 1', 'Phase 2', 'Phase 3', 'Phase 4'], rows),
+        'totaltrials': rng.integers(1, 20, rows),
+    })
+    frame['country-code'] = pd.Series(frame['Study population']).map({name: code for code, name in enumerate(countries)})
+    return frame.groupby(['Study population', 'country-code', 'year', 'phase'], as_index=False)['totaltrials'].sum()
+
+
+def _previous(frame, years, phases):
+    # what task3.py/task4.py computed on every rerun before the index
+    selected = frame[frame['year'].between(*years) & frame['phase'].isin(phases)]
+    return selected.groupby(['Study population', 'country-code'])['totaltrials'].sum().sort_values(ascending=False)
+
+
+QUERIES = [
+    ((1990, 2019), ['Phase 1', 'Phase 2', 'Phase 3', 'Phase 4']),
+    ((1995, 2005), ['Phase 3']),
+    ((1999, 2003), ['Phase 1', 'Phase 2']),
+    # no trials in these years
+    ((2000, 2002), ['Phase 1', 'Phase 2']),
+    ((2010, 2010), ['Phase 2', 'Phase 4']),
+    ((1980, 2030), ['Phase 4']),
+]
+
+
+@pytest.mark.parametrize('years, phases', QUERIES)
+def test_totals_match_previous_groupby(years, phases):
+    frame = _counts()
+    index = year_index.YearRangeIndex(frame, ['Study population', 'country-code'], 'totaltrials')
+    expected = _previous(frame, years, phases)
+    totals = index.totals(years, phases)
+    assert totals[totals > 0].to_dict() == expected.to_dict()
+
+    top = index.top(None, years, phases)
+    assert list(top.to_numpy()) == list(expected.to_numpy())
+    assert top.to_dict() == expected.to_dict()
+    top3 = index.top(3, years, phases)
+    assert list(top3.to_numpy()) == list(expected.to_numpy()[:3])
+
+
+def test_phases_in_match_previous_filter():
+    frame = _counts()
+    index = year_index.YearRangeIndex(frame, ['Study population', 'country-code'], 'totaltrials')
+    for years, _ in QUERIES:
+        selected = frame[frame['year'].between(*years)]
+        assert index.phases_in(years) == sorted(selected['phase'].unique())
@@ -0,0 +1,206 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+import datasets
+
+# Per-rerun stage timings for the dashboards.
+#
+# A script brackets its body with `timings.begin(...)`/`timings.end()` (or
+# `with timings.rerun(...)`) and wraps each step in `timings.stage(...)` (or
+# decorates a function with `@timings.timed(...)`). Every stage records its
+# wall time, the rows going in and out and, for chart stages, the bytes sent
+# to the browser. At the end of the rerun the trace is appended as one JSON
+# line to BMI706_TRACE_LOG (default build/trace/<script>.jsonl) and
+# `timings.sidebar()` shows it in a debug panel.
+#
+# Tracing is off unless BMI706_TRACE=1. When off, stage() hands back one
+# shared no-op object and timed() returns the function unchanged, so the
+# instrumentation costs a function call and an attribute check per stage.
+
+ENABLED = os.environ.get('BMI706_TRACE', '') not in ('', '0')
+TRACE_DIR = os.path.join(datasets.BUILD_DIR, 'trace')
+LOG_PATH = os.environ.get('BMI706_TRACE_LOG')
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+def _rows(value):
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class Span:
+
+    __slots__ = ('name', 'rows_in', 'rows_out', 'payload_bytes', 'seconds', '_start')
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.payload_bytes = None
+        self.seconds = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._start
+        return False
+
+    def output(self, value):
+        # records len(value) as rows out and returns value unchanged
+        self.rows_out = _rows(value)
+        return value
+
+    def payload(self, chart):
+        # records the serialized size of an altair chart or a spec dict
+        self.payload_bytes = payload_bytes(chart)
+        return chart
+
+    def as_dict(self):
+        return {
+            'stage': self.name,
+            'ms': round(self.seconds * 1000, 3) if self.seconds is not None else None,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'payload_bytes': self.payload_bytes,
+        }
+
+
+class _NoSpan:
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def output(self, value):
+        return value
+
+    def payload(self, chart):
+        return chart
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Trace:
+
+    def __init__(self, script):
+        self.script = script
+        self.started = time.time()
+        self.spans = []
+        self.seconds = None
+
+    def as_dict(self):
+        return {
+            'script': self.script,
+            'started': self.started,
+            'ms': round(self.seconds * 1000, 3) if self.seconds is not None else None,
+            'stages': [span.as_dict() for span in self.spans],
+        }
+
+
+def payload_bytes(chart):
+    import charts
+
+    if isinstance(chart, dict):
+        return charts.payload_bytes(chart)
+    return len(chart.to_json().encode())
+
+
+def current():
+    return getattr(_local, 'trace', None)
+
+
+def stage(name, rows_in=None):
+    # `with timings.stage('filter', df) as span: out = span.output(...)`;
+    # rows_in is a row count or anything with a len()
+    if not ENABLED:
+        return _NO_SPAN
+    trace = current()
+    span = Span(name, _rows(rows_in))
+    if trace is not None:
+        trace.spans.append(span)
+    return span
+
+
+def timed(name=None):
+    # decorator form of stage(): rows in from the first argument, rows out
+    # from the result
+    def decorate(function):
+        if not ENABLED:
+            return function
+        label = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(label, args[0] if args else None) as span:
+                return span.output(function(*args, **kwargs))
+        return wrapper
+    return decorate
+
+
+def _write(trace):
+    path = LOG_PATH or os.path.join(TRACE_DIR, f'{trace.script}.jsonl')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    line = json.dumps(trace.as_dict())
+    with _log_lock, open(path, 'a') as f:
+        f.write(line + '\n')
+
+
+def begin(script):
+    # starts this thread's trace; Streamlit runs each rerun in its own thread
+    if not ENABLED:
+        return None
+    _local.trace = Trace(script)
+    _local.start = time.perf_counter()
+    return _local.trace
+
+
+def end():
+    # finishes the current trace and appends it to the log
+    trace = current()
+    if trace is None:
+        return None
+    trace.seconds = time.perf_counter() - _local.start
+    _local.trace = None
+    _write(trace)
+    return trace
+
+
+@contextlib.contextmanager
+def rerun(script):
+    trace = begin(script)
+    try:
+        yield trace
+    finally:
+        end()
+
+
+def sidebar():
+    # debug panel with the stages of this rerun so far; call it last in the
+    # script
+    trace = current()
+    if trace is None:
+        return
+    import pandas as pd
+    import streamlit as st
+
+    with st.sidebar.expander('Debug: stage timings'):
+        elapsed = sum(span.seconds or 0 for span in trace.spans)
+        st.write(f'{len(trace.spans)} stages, {elapsed * 1000:.1f} ms')
+        st.dataframe(pd.DataFrame([span.as_dict() for span in trace.spans]))
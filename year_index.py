@@ -0,0 +1,164 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+import aggregates
+
+# Year-range index over pre-aggregated count tables.
+#
+# Counts are held in one Fenwick tree per (key, phase) along the year axis,
+# stored together as a (keys, phases, years + 1) array so a query walks
+# O(log #years) slices and each step is a single vectorized add. Answering
+# "totals per key for years [a, b] and phases S" therefore costs
+# O(#keys * #phases * log #years), independent of how many trials were
+# counted, and top-K uses argpartition instead of sorting every key.
+
+
+class YearRangeIndex:
+
+    def __init__(self, table, key, count, phase='phase', year='year', like=None):
+        # `like` is another index whose phases and years are used instead of
+        # the table's, e.g. to index part of a table on the same axes
+        self.key = key
+        key_frame = table[key if isinstance(key, list) else [key]].drop_duplicates()
+        if isinstance(key, list):
+            self.keys = pd.MultiIndex.from_frame(key_frame).sort_values()
+        else:
+            self.keys = pd.Index(key_frame[key]).sort_values()
+        if like is None:
+            self.phases = pd.Index(sorted(table[phase].unique()))
+            self.first_year = int(table[year].min())
+            self.last_year = int(table[year].max())
+        else:
+            self.phases, self.first_year, self.last_year = like.phases, like.first_year, like.last_year
+
+        dense = np.zeros((len(self.keys), len(self.phases), self.last_year - self.first_year + 2), dtype=np.int64)
+        key_pos = self._key_positions(table)
+        phase_pos = self.phases.get_indexer(table[phase])
+        year_pos = table[year].to_numpy(dtype=np.int64) - self.first_year + 1
+        # rows off the axes (possible with `like`) would be counted under
+        # the wrong phase or year
+        if (phase_pos < 0).any():
+            raise ValueError(f'phases not in the index: {sorted(set(table[phase][phase_pos < 0]))}')
+        outside = (year_pos < 1) | (year_pos > self.last_year - self.first_year + 1)
+        if outside.any():
+            raise ValueError(f'years outside {self.first_year}-{self.last_year}: {sorted(set(table[year][outside].tolist()))}')
+        np.add.at(dense, (key_pos, phase_pos, year_pos), table[count].to_numpy(dtype=np.int64))
+
+        # in-place Fenwick construction: push every node into its parent
+        size = dense.shape[2]
+        for i in range(1, size):
+            parent = i + (i & -i)
+            if parent < size:
+                dense[:, :, parent] += dense[:, :, i]
+        self._tree = dense
+
+    def _key_positions(self, table):
+        if isinstance(self.key, list):
+            return self.keys.get_indexer(pd.MultiIndex.from_frame(table[self.key]))
+        return self.keys.get_indexer(table[self.key])
+
+    def _prefix(self, year):
+        # sums of every (key, phase) over years <= year
+        i = min(max(year - self.first_year + 1, 0), self._tree.shape[2] - 1)
+        total = np.zeros(self._tree.shape[:2], dtype=np.int64)
+        while i > 0:
+            total += self._tree[:, :, i]
+            i -= i & -i
+        return total
+
+    def _range(self, years):
+        start, end = years
+        return self._prefix(end) - self._prefix(start - 1)
+
+    def add(self, key, phase, year, count):
+        # Point update used for incremental ingest; the key, phase and year
+        # must already be covered by the index.
+        k = self.keys.get_loc(key)
+        p = self.phases.get_loc(phase)
+        i = year - self.first_year + 1
+        if not (0 < i < self._tree.shape[2]):
+            raise KeyError(year)
+        while i < self._tree.shape[2]:
+            self._tree[k, p, i] += count
+            i += i & -i
+
+    def add_table(self, table, count, phase='phase', year='year'):
+        # add() for every row of a table laid out like the one indexed
+        if isinstance(self.key, list):
+            keys = table[self.key].itertuples(index=False, name=None)
+        else:
+            keys = table[self.key]
+        for key, phase_value, year_value, value in zip(keys, table[phase], table[year], table[count]):
+            self.add(key, phase_value, int(year_value), int(value))
+
+    def copy(self):
+        other = object.__new__(YearRangeIndex)
+        other.__dict__.update(self.__dict__)
+        other._tree = self._tree.copy()
+        return other
+
+    def phases_in(self, years):
+        # phases with at least one trial in the year range
+        per_phase = self._range(years).sum(axis=0)
+        return list(self.phases[per_phase > 0])
+
+    def totals(self, years, phases=None):
+        counts = self._range(years)
+        if phases is not None:
+            selected = self.phases.get_indexer(list(phases))
+            counts = counts[:, selected[selected >= 0]]
+        return pd.Series(counts.sum(axis=1), index=self.keys)
+
+    def top(self, k, years, phases=None):
+        # keys with a non-zero total, largest first; k=None returns all of them
+        totals = self.totals(years, phases)
+        values = totals.to_numpy()
+        nonzero = np.flatnonzero(values)
+        if k is not None and k < len(nonzero):
+            nonzero = np.sort(nonzero[np.argpartition(-values[nonzero], k - 1)[:k]])
+        order = nonzero[np.argsort(-values[nonzero], kind='stable')]
+        return totals.iloc[order]
+
+
+_lock = threading.Lock()
+# (table name, key, count) -> (table version, YearRangeIndex)
+_indexes = {}
+
+
+def load(name, key, count):
+    # process-wide index over an aggregates table, rebuilt when the table changes
+    cache_key = (name, tuple(key) if isinstance(key, list) else key, count)
+    version = aggregates.version(name)
+    with _lock:
+        cached = _indexes.get(cache_key)
+    if cached is None or cached[0] != version:
+        cached = (version, YearRangeIndex(aggregates.load(name), key, count))
+        with _lock:
+            _indexes[cache_key] = cached
+    return cached[1]
+
+
+def apply_delta(name, delta, version):
+    # Brings the indexes over `name` that were built from table version
+    # `version` up to date with `delta` (rows of added counts) instead of
+    # rebuilding them. Readers keep the old index; the update goes to a copy.
+    # Indexes the delta does not fit (new key, phase or year) are dropped and
+    # rebuilt by the next load().
+    current = aggregates.version(name)
+    with _lock:
+        entries = [(key, cached) for key, cached in _indexes.items() if key[0] == name]
+    for cache_key, (built_from, index) in entries:
+        updated = None
+        if built_from == version:
+            updated = index.copy()
+            try:
+                updated.add_table(delta, cache_key[2])
+            except KeyError:
+                updated = None
+        with _lock:
+            if updated is None:
+                _indexes.pop(cache_key, None)
+            else:
+                _indexes[cache_key] = (current, updated)